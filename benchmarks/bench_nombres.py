@@ -0,0 +1,77 @@
+# Benchmark del motor de nombres sobre una biblioteca sintetica
+#
+# Uso: python -m benchmarks.bench_nombres [cantidad_de_temas]
+
+import os
+import random
+import sys
+import time
+
+from src import nombres
+
+_WORDS = [
+    "Amor", "Noche", "Canción", "Señor", "Café", "Über", "東京", "Любовь",
+    "Live", "Remix", "feat.", "AC/DC", "Vol: 2", "¿Qué?", "<Intro>", "CON",
+    "Mañana", "Corazón", "Déjà", "vu", "Ñandú", "Straße", "Pt. 1", "Outro",
+]
+
+
+def _synthetic_library(tracks: int, seed: int = 0) -> list:
+    """
+    Contrato:
+        Genera titulos de una biblioteca ficticia con repeticiones realistas.
+    Postcondiciones:
+        Devuelve tuplas `(artista, disco, titulo)`; artistas y discos se repiten
+        y algunos titulos de un mismo disco colisionan a proposito.
+    """
+    rng = random.Random(seed)
+    artists = [" ".join(rng.choices(_WORDS, k=2)) for _ in range(tracks // 200 or 1)]
+    library = []
+    for index in range(tracks):
+        artist = artists[index // 200 % len(artists)]
+        album = f"Album - {artist} {index // 12}"
+        if index % 6 == 0:
+            # Titulos que solo difieren en mayusculas o signos invalidos
+            title = rng.choice(["Intro", "intro", "Intro?", "Intro:", "Intro/"])
+        else:
+            title = f"{index % 12 + 1:02d} - " + " ".join(rng.choices(_WORDS, k=rng.randint(1, 6)))
+        library.append((artist, album, f"{title}.mp3"))
+    return library
+
+
+def _run(library: list) -> tuple:
+    """
+    Contrato:
+        Calcula rutas finales como lo hacen los dos flujos de descarga.
+    Postcondiciones:
+        Devuelve `(segundos, colisiones_resueltas)`.
+    """
+    started = time.perf_counter()
+    collisions = 0
+    taken_by_album = {}
+    for artist, album, title in library:
+        folder = os.path.join(
+            nombres._safe_dir_name(artist),
+            nombres._safe_dir_name(nombres._clean_album_name(album)),
+        )
+        nombres._slugify(artist)
+        nombres._slugify(album)
+        name = nombres._fit_file_name(folder, nombres._safe_file_name(title))
+        unique = nombres._unique_name(name, taken_by_album.setdefault(folder, set()))
+        collisions += unique != name
+    return time.perf_counter() - started, collisions
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    tracks = int(argv[0]) if argv else 200_000
+    library = _synthetic_library(tracks)
+    cold, collisions = _run(library)
+    warm, _ = _run(library)
+    print(f"{tracks} temas, {collisions} colisiones resueltas")
+    print(f"cache fria:     {cold:.2f} s ({tracks / cold:,.0f} temas/s)")
+    print(f"cache caliente: {warm:.2f} s ({tracks / warm:,.0f} temas/s)")
+
+
+if __name__ == "__main__":
+    main()
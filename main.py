@@ -1,31 +1,36 @@
 import sys
 # Importamos los módulos (ahora es seguro porque el código está encapsulado)
-from src import pyspotify, pyyoutube
+from src import pyspotify, pyyoutube, servidor
 
 def main():
     """
     Contrato:
         Selecciona el flujo de descarga a ejecutar segun las banderas de CLI.
     Precondiciones:
-        `sys.argv` puede incluir `--sp` para Spotify o `--yt` para YouTube.
+        `sys.argv` puede incluir `--sp` para Spotify, `--yt` para YouTube o
+        `--serve` para el servidor local de trabajos.
     Postcondiciones:
-        Si la bandera es valida, delega la ejecucion al modulo correspondiente.
+        Si la bandera es valida, delega la ejecucion al modulo correspondiente
+        con el resto de los argumentos. Para uso embebido ver `src.api.Downloader`.
         Si falta la bandera, informa el uso esperado por consola.
     """
-    # Revisamos qué bandera está presente
-    if "--sp" in sys.argv:
-        # IMPORTANTE: Quitamos '--sp' de sys.argv para que pyspotify
-        # no se queje de un "unrecognized argument: --sp"
-        sys.argv.remove("--sp")
-        pyspotify.main()
-        
-    elif "--yt" in sys.argv:
-        # Lo mismo para YouTube, quitamos la bandera antes de pasar el control
-        sys.argv.remove("--yt")
-        pyyoutube.main()
+    args = sys.argv[1:]
+    # Revisamos qué bandera está presente y pasamos el resto de los argumentos
+    # al flujo correspondiente, sin modificar sys.argv
+    if "--sp" in args:
+        args.remove("--sp")
+        pyspotify.main(args)
+
+    elif "--yt" in args:
+        args.remove("--yt")
+        pyyoutube.main(args)
+
+    elif "--serve" in args:
+        args.remove("--serve")
+        servidor.main(args)
 
     else:
-        print("Error: Debes especificar --sp (Spotify) o --yt (YouTube)")
+        print("Error: Debes especificar --sp (Spotify), --yt (YouTube) o --serve (servidor)")
         print("Ejemplo: uv run python main.py --sp -f lista.txt")
 
 if __name__ == "__main__":
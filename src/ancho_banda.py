@@ -0,0 +1,326 @@
+# Presupuesto de ancho de banda unico para todo el proceso (token bucket)
+
+import argparse
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+
+_RATE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?$")
+_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+_UNLIMITED = ("0", "max", "ilimitado", "sin-limite")
+_TIME_RE = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+# Tipo de un perfil horario: minuto de inicio, minuto de fin y bytes/s (`None` = sin limite).
+Profile = tuple[int, int, Optional[int]]
+
+
+def _parse_rate(value: str) -> Optional[int]:
+    """
+    Contrato:
+        Convierte una velocidad de la CLI (`2M`, `512K`, `1.5MiB/s`) a bytes por segundo.
+    Postcondiciones:
+        Devuelve `None` para `0`, `max` o `ilimitado` (sin limite). Las unidades
+        son binarias, como `--limit-rate` de yt-dlp. Lanza
+        `argparse.ArgumentTypeError` si el valor no es valido.
+    """
+    text = str(value).strip().lower()
+    if text in _UNLIMITED:
+        return None
+    match = _RATE_RE.match(text)
+    if not match:
+        raise argparse.ArgumentTypeError(f"velocidad invalida: {value!r} (ej.: 2M, 512K, 0)")
+    return max(1, int(float(match.group(1)) * _UNITS[match.group(2)]))
+
+
+def _parse_minutes(value: str, allow_end: bool = False) -> int:
+    """
+    Convierte `HH:MM` a minutos desde medianoche; `24:00` solo como fin.
+    """
+    match = _TIME_RE.match(value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"hora invalida: {value!r} (ej.: 08:30)")
+    minutes = int(match.group(1)) * 60 + int(match.group(2))
+    if int(match.group(2)) >= 60 or minutes > (1440 if allow_end else 1439):
+        raise argparse.ArgumentTypeError(f"hora invalida: {value!r}")
+    return minutes
+
+
+def _parse_profiles(value: str) -> List[Profile]:
+    """
+    Contrato:
+        Interpreta perfiles horarios como `08:00-18:00=2M,18:00-08:00=0`.
+    Postcondiciones:
+        Devuelve una lista de `(inicio, fin, bytes/s)` en minutos de la hora
+        local; un tramo cuyo fin es menor que su inicio cruza la medianoche.
+        Una cadena vacia devuelve una lista vacia. Lanza
+        `argparse.ArgumentTypeError` si algun tramo no es valido.
+    """
+    profiles = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        span, sep, rate = item.partition("=")
+        start, dash, end = span.partition("-")
+        if not sep or not dash:
+            raise argparse.ArgumentTypeError(
+                f"perfil invalido: {item!r} (formato HH:MM-HH:MM=velocidad)"
+            )
+        profiles.append(
+            (_parse_minutes(start), _parse_minutes(end, allow_end=True), _parse_rate(rate))
+        )
+    return profiles
+
+
+def _format_rate(rate: Optional[float]) -> str:
+    """
+    Formatea una velocidad en bytes por segundo para la consola.
+    """
+    if rate is None:
+        return "sin limite"
+    return f"{rate / 1024**2:.2f} MiB/s"
+
+
+class BandwidthScheduler:
+    """
+    Presupuesto de ancho de banda compartido por todas las descargas del proceso.
+
+    Los procesos externos (`spotdl`) no pueden frenarse bloque a bloque: piden
+    con `_lease` una porcion fija del presupuesto al arrancar y se la pasan a
+    su `yt-dlp` como `--limit-rate`. Las porciones nunca toman la fraccion
+    `reserve` del presupuesto, que queda para las descargas en proceso: asi
+    una descarga de `yt-dlp` que empieza durante un album de `spotdl` avanza
+    en lugar de quedar bloqueada hasta que el album termine. Cada porcion sale
+    de lo que queda sin reservar, repartido entre las descargas en proceso y
+    la nueva; si no queda nada, `_lease` espera a que se libere una porcion.
+
+    Las descargas de `yt-dlp` en proceso comparten el resto (`_inprocess_rate`)
+    y llaman a `_consume` con los bytes de cada bloque desde su hook de
+    progreso; cuando el saldo se agota, el hook duerme y `yt-dlp` deja de leer
+    del socket hasta recuperarlo. Asi la suma de porciones y descargas en
+    proceso no supera el presupuesto.
+
+    La velocidad vigente sale del perfil horario que cubre la hora local o,
+    fuera de todo perfil, de la velocidad base. `set_rate` y `set_profiles`
+    la cambian en caliente: las descargas en proceso la toman en su siguiente
+    bloque y las porciones ya entregadas recien al terminar su disco.
+    """
+
+    # Cada cuanto se revisa el presupuesto mientras se espera una porcion libre.
+    RECHECK = 0.5
+    # Fraccion del presupuesto que las porciones de `spotdl` no pueden tomar.
+    DEFAULT_RESERVE = 0.25
+
+    def __init__(
+        self,
+        rate: Optional[int] = None,
+        profiles: Optional[List[Profile]] = None,
+        burst: float = 1.0,
+        window: float = 5.0,
+        reserve: float = DEFAULT_RESERVE,
+    ):
+        self._rate = rate
+        self._profiles = list(profiles or [])
+        self._reserve = reserve
+        self._burst = burst
+        self._window = window
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._sessions = 0
+        self._leases = 0
+        self._leased = 0
+        self._samples = deque()
+
+    def set_rate(self, rate: Optional[int]):
+        """
+        Cambia la velocidad base (`None` = sin limite).
+        """
+        with self._cond:
+            self._rate = rate
+            self._cond.notify_all()
+
+    def set_profiles(self, profiles: List[Profile]):
+        """
+        Reemplaza los perfiles horarios; una lista vacia deja solo la velocidad base.
+        """
+        with self._cond:
+            self._profiles = list(profiles)
+            self._cond.notify_all()
+
+    def _settings(self) -> dict:
+        """
+        Devuelve la velocidad base y los perfiles horarios configurados.
+        """
+        with self._lock:
+            return {"rate": self._rate, "profiles": [list(profile) for profile in self._profiles]}
+
+    def _current_rate(self) -> Optional[int]:
+        """
+        Contrato:
+            Calcula el presupuesto total vigente segun la hora local.
+        Precondiciones:
+            Debe llamarse con `_lock` tomado.
+        """
+        now = time.localtime()
+        minute = now.tm_hour * 60 + now.tm_min
+        for start, end, rate in self._profiles:
+            if start <= end:
+                inside = start <= minute < end
+            else:
+                inside = minute >= start or minute < end
+            if inside:
+                return rate
+        return self._rate
+
+    def _inprocess_rate(self) -> Optional[int]:
+        """
+        Presupuesto para las descargas en proceso: el total menos lo reservado
+        por procesos externos (0 si esta todo reservado), con `_lock` tomado.
+        """
+        rate = self._current_rate()
+        if rate is None:
+            return None
+        return max(0, rate - self._leased)
+
+    def _trim(self, now: float):
+        """
+        Descarta las muestras fuera de la ventana de medicion (con `_lock` tomado).
+        """
+        while self._samples and self._samples[0][0] < now - self._window:
+            self._samples.popleft()
+
+    def _consume(self, size: int, cancel: Optional[threading.Event] = None):
+        """
+        Contrato:
+            Descuenta `size` bytes recibidos y espera si el presupuesto se agoto.
+        Precondiciones:
+            Debe llamarse desde el hilo que descarga, despues de leer los bytes.
+        Postcondiciones:
+            Vuelve cuando el saldo deja de estar en rojo. Varias descargas
+            comparten el mismo saldo, asi la suma respeta el presupuesto.
+            Si todo el presupuesto esta reservado por `_lease`, espera a que
+            se libere una porcion. Si `cancel` se activa, vuelve enseguida.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._samples.append((now, size))
+            self._trim(now)
+            rate = self._inprocess_rate()
+            while rate == 0 and not (cancel is not None and cancel.is_set()):
+                self._cond.wait(self.RECHECK)
+                now = time.monotonic()
+                self._updated = now
+                rate = self._inprocess_rate()
+            if rate is None or rate == 0:
+                self._tokens = 0.0
+                self._updated = now
+                return
+            self._tokens = min(self._tokens + (now - self._updated) * rate, rate * self._burst)
+            self._updated = now
+            self._tokens -= size
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            if cancel is not None:
+                cancel.wait(wait)
+            else:
+                time.sleep(wait)
+
+    @contextmanager
+    def _session(self):
+        """
+        Registra una descarga en proceso mientras dura el bloque `with`.
+        """
+        with self._lock:
+            self._sessions += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._sessions -= 1
+
+    @contextmanager
+    def _lease(self, cancel: Optional[threading.Event] = None):
+        """
+        Contrato:
+            Reserva una porcion fija del presupuesto para un proceso externo.
+        Postcondiciones:
+            Entrega la porcion en bytes/s (`None` si no hay limite): lo que
+            queda sin reservar fuera de la fraccion `reserve`, dividido entre
+            las descargas en proceso y esta.
+            Si no queda nada, espera a que termine otra reserva o cambie el
+            presupuesto; si `cancel` se activa mientras espera, entrega 1 B/s
+            para que el llamador corte enseguida. Mientras dura el bloque la
+            porcion se descuenta de las descargas en proceso.
+        """
+        with self._cond:
+            while True:
+                rate = self._current_rate()
+                if rate is None:
+                    share = None
+                    break
+                available = rate - int(rate * self._reserve) - self._leased
+                if available > 0:
+                    share = max(1, available // (self._sessions + 1))
+                    break
+                if cancel is not None and cancel.is_set():
+                    share = 1
+                    break
+                self._cond.wait(self.RECHECK)
+            self._leases += 1
+            self._leased += share or 0
+        try:
+            yield share
+        finally:
+            with self._cond:
+                self._leased -= share or 0
+                self._leases -= 1
+                self._cond.notify_all()
+
+    def _status(self) -> dict:
+        """
+        Contrato:
+            Resume el uso del presupuesto.
+        Postcondiciones:
+            Devuelve `budget` (bytes/s vigentes o `None`), `inprocess_speed`
+            (bytes/s medidos en las descargas en proceso en la ultima ventana),
+            `leased` (bytes/s reservados por procesos externos, que no pueden
+            medirse y se cuentan como usados), `aggregate_speed` (la suma de
+            ambos), `sessions` (descargas en proceso) y `leases` (reservas).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            # Al arrancar la ventana todavia no esta llena: se mide sobre lo transcurrido
+            span = min(self._window, max(1.0, now - self._samples[0][0])) if self._samples else 1.0
+            inprocess = sum(size for _, size in self._samples) / span
+            return {
+                "budget": self._current_rate(),
+                "aggregate_speed": inprocess + self._leased,
+                "inprocess_speed": inprocess,
+                "leased": self._leased,
+                "sessions": self._sessions,
+                "leases": self._leases,
+            }
+
+
+def _from_args(
+    rate: Optional[int],
+    profiles: Optional[List[Profile]],
+    always: bool = False,
+    reserve: float = BandwidthScheduler.DEFAULT_RESERVE,
+) -> Optional[BandwidthScheduler]:
+    """
+    Contrato:
+        Crea el presupuesto del proceso a partir de las opciones de la CLI.
+    Precondiciones:
+        `reserve` es la fraccion que se guarda para descargas en proceso; un
+        proceso que solo lanza `spotdl` puede pasar 0 para usar todo.
+    Postcondiciones:
+        Devuelve `None` si no hay velocidad ni perfiles, salvo con `always`
+        (un servidor lo necesita para poder fijar un limite en caliente).
+    """
+    if rate is None and not profiles and not always:
+        return None
+    return BandwidthScheduler(rate, profiles, reserve=reserve)
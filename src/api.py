@@ -0,0 +1,567 @@
+# API embebible para descargar desde Spotify y YouTube sin pasar por la CLI
+
+import logging
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+from src import ancho_banda, funcionessp, funcionesyt, journal, plan, replaygain, staging
+
+SPOTIFY = "spotify"
+YOUTUBE = "youtube"
+SOURCES = (SPOTIFY, YOUTUBE)
+
+# Estados finales de un UrlResult ademas de `journal.DONE` y `journal.FAILED`.
+RESUMED = "resumed"
+IGNORED = "ignored"
+CANCELLED = "cancelled"
+
+# Tipo de un trabajo: URL y, opcionalmente, las partes de carpeta ya resueltas.
+# Puede llevar un tercer elemento con la metadata de Spotify ya resuelta.
+Job = tuple[str, Optional[tuple]] | tuple[str, Optional[tuple], Optional[list]]
+
+
+@dataclass
+class TrackResult:
+    """
+    Resultado de un tema descargado.
+    """
+
+    path: Path
+    size: int
+
+
+@dataclass
+class UrlResult:
+    """
+    Resultado de procesar una URL: estado final, carpeta, temas y error.
+    """
+
+    url: str
+    source: Optional[str]
+    status: str
+    folder: Optional[Path] = None
+    tracks: List[TrackResult] = field(default_factory=list)
+    error: Optional[str] = None
+    bytes_fetched: int = 0
+    bytes_saved: int = 0
+    renditions: dict = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.status in (journal.DONE, RESUMED)
+
+
+def _source_of(url: str) -> Optional[str]:
+    """
+    Contrato:
+        Determina la fuente de una URL.
+    Precondiciones:
+        `url` debe ser una cadena ya normalizada con `strip`.
+    Postcondiciones:
+        Devuelve `spotify`, `youtube` o `None` si no pertenece a ninguna fuente.
+    """
+    if funcionessp._is_spotify_url(url):
+        return SPOTIFY
+    if funcionesyt._is_youtube_url(url):
+        return YOUTUBE
+    return None
+
+
+def _summary(results: Iterable[UrlResult]) -> dict:
+    """
+    Contrato:
+        Reconstruye el resumen clasico de la CLI a partir de resultados.
+    Precondiciones:
+        `results` debe contener resultados devueltos por `Downloader`.
+    Postcondiciones:
+        Devuelve un diccionario con `procesados`, `ok`, `fallidos` e `ignorados`,
+        y los totales `bytes_descargados` y `bytes_ahorrados`.
+    """
+    resumen = {
+        "procesados": 0,
+        "ok": 0,
+        "fallidos": 0,
+        "ignorados": 0,
+        "bytes_descargados": 0,
+        "bytes_ahorrados": 0,
+    }
+    for result in results:
+        if result.status == IGNORED:
+            resumen["ignorados"] += 1
+            continue
+        resumen["procesados"] += 1
+        resumen["ok" if result.ok else "fallidos"] += 1
+        resumen["bytes_descargados"] += result.bytes_fetched
+        resumen["bytes_ahorrados"] += result.bytes_saved
+    return resumen
+
+
+def _folder_parts(entry: dict) -> tuple:
+    """
+    Contrato:
+        Convierte una entrada de plan en las partes de carpeta de su fuente.
+    Postcondiciones:
+        Devuelve `(artista, disco)` para Spotify y `(artista, disco, es_playlist)`
+        para YouTube, tal como los reciben las funciones de descarga.
+    """
+    if entry["source"] == SPOTIFY:
+        return (entry["artist"], entry["album"])
+    return (entry["artist"], entry["album"], entry.get("is_playlist", True))
+
+
+def _album_mp3s(folder: Path, published: Optional[Path] = None) -> List[Path]:
+    """
+    Contrato:
+        Lista todos los MP3 de un disco, no solo los de esta descarga.
+    Precondiciones:
+        `folder` es la carpeta donde quedo el disco; con staging, `published`
+        es la carpeta final, que puede tener temas de ejecuciones anteriores.
+    Postcondiciones:
+        Devuelve los MP3 de `folder` mas los de `published` que no van a ser
+        reemplazados, asi el ReplayGain de disco se calcula sobre el disco
+        completo aunque `spotdl` haya salteado temas ya existentes.
+    """
+    tracks = sorted(folder.glob("*.mp3"))
+    if published is not None and published.is_dir():
+        staged = {path.name for path in tracks}
+        tracks += sorted(path for path in published.glob("*.mp3") if path.name not in staged)
+    return tracks
+
+
+class Downloader:
+    """
+    Descargador reutilizable para procesos de larga duracion.
+
+    Recibe las opciones como argumentos, devuelve resultados estructurados por
+    URL y por tema, informa el avance mediante callbacks y nunca termina el
+    interprete, de modo que un mismo proceso puede atender muchos trabajos.
+
+    `on_event(evento, datos)` recibe los estados del diario (`queued`,
+    `resolving`, `downloading`, `post-processing`, `done`, `failed`) y ademas
+    `started`, `resumed`, `ignored` y `replaygain`; la fase de resolucion emite `planning`,
+    `planned` y `plan-failed`. `datos` incluye siempre `url` y `source`.
+    Con `staging_dir`, cada disco se arma y post-procesa en ese directorio local
+    y recien al terminar se publica en `outdir` con `staging._publish_album`.
+    En YouTube el formato de origen se elige segun `kbps` (y `max_filesize`) y
+    `done` informa `bytes_fetched` y `bytes_saved` respecto de `bestaudio`.
+    Con `renditions` (lista `(codec, kbps)`), cada disco de YouTube se baja una
+    vez y se guarda en un arbol por version (`outdir/mp3-320/...`).
+    Con `prefetch` K, `run` resuelve en segundo plano la metadata de los K
+    trabajos siguientes mientras descarga el actual.
+    Con `bandwidth`, todas las descargas (de este y de otros `Downloader` que
+    compartan el mismo `ancho_banda.BandwidthScheduler`) respetan un unico
+    presupuesto de ancho de banda.
+
+    `on_progress(datos)` recibe los diccionarios de progreso de `yt-dlp` con
+    la clave `url` agregada y, con `bandwidth`, `budget`, `aggregate_speed`
+    (en proceso mas lo reservado por `spotdl`) e `inprocess_speed`.
+    """
+
+    def __init__(
+        self,
+        outdir: Optional[Path] = None,
+        kbps: int = 128,
+        cookies: Optional[str] = None,
+        proxy: Optional[str] = None,
+        rate_limit: Optional[str] = None,
+        no_warnings: bool = True,
+        no_playlist: bool = False,
+        sources: Iterable[str] = SOURCES,
+        journal_path: Optional[Path] = None,
+        resume: bool = False,
+        verbose: bool = False,
+        spotdl_engine: str = funcionessp.SUBPROCESS_ENGINE,
+        replaygain: bool = False,
+        replaygain_workers: Optional[int] = None,
+        staging_dir: Optional[Path] = None,
+        max_filesize: Optional[int] = None,
+        renditions: Optional[list] = None,
+        prefetch: int = 0,
+        bandwidth: Optional[ancho_banda.BandwidthScheduler] = None,
+        on_event: Optional[Callable[[str, dict], None]] = None,
+        on_progress: Optional[Callable[[dict], None]] = None,
+    ):
+        self.outdir = Path(outdir or funcionessp.RAIZ).resolve()
+        self.kbps = kbps
+        self.cookies = cookies
+        self.proxy = proxy
+        self.rate_limit = rate_limit
+        self.no_warnings = no_warnings
+        self.no_playlist = no_playlist
+        self.sources = tuple(sources)
+        self.journal_path = journal_path
+        self.resume = resume
+        self.verbose = verbose
+        self.spotdl_engine = spotdl_engine
+        self.replaygain = replaygain
+        self.replaygain_workers = replaygain_workers
+        self.staging_dir = Path(staging_dir).resolve() if staging_dir else None
+        self.max_filesize = max_filesize
+        self.renditions = renditions
+        self.prefetch = max(0, prefetch)
+        self.bandwidth = bandwidth
+        self.on_event = on_event
+        self.on_progress = on_progress
+        self._dependencies = {}
+
+    def _emit(self, url: str, source: Optional[str], event: str, **extra):
+        """
+        Contrato:
+            Registra un evento en el diario (si es un estado) y lo notifica.
+        Precondiciones:
+            Los valores de `extra` deben ser serializables a JSON.
+        Postcondiciones:
+            Los errores del callback se registran sin cortar la descarga.
+        """
+        if event in journal.STATES:
+            journal._append(self.journal_path, url, source, event, **extra)
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event, {"url": url, "source": source, **extra})
+        except Exception as e:
+            logging.error(f"Error en el callback de eventos: {e}")
+
+    def _check_dependencies(self, source: str) -> bool:
+        """
+        Contrato:
+            Verifica una sola vez por proceso las dependencias de una fuente.
+        Postcondiciones:
+            Devuelve el resultado cacheado de la verificacion del modulo.
+        """
+        if source not in self._dependencies:
+            module = funcionessp if source == SPOTIFY else funcionesyt
+            self._dependencies[source] = module._check_dependencies()
+        return self._dependencies[source]
+
+    def _progress_hook(
+        self, url: str, cancel: Optional[threading.Event] = None
+    ) -> Optional[Callable[[dict], None]]:
+        """
+        Contrato:
+            Construye el hook de progreso de `yt-dlp` para una URL.
+        Postcondiciones:
+            Reenvia el progreso a `on_progress`; sin callback, imprime solo en
+            modo `verbose`. Con `bandwidth`, antes descuenta del presupuesto los
+            bytes nuevos de cada bloque (y espera si se agoto) y agrega el uso
+            total al progreso. Sin nada que hacer devuelve `None`.
+        """
+        if self.on_progress is None:
+            forward = funcionesyt._print_progress if self.verbose else None
+        else:
+            forward = lambda d: self.on_progress({**d, "url": url})
+        if self.bandwidth is None:
+            return forward
+        bandwidth = self.bandwidth
+        seen = {}
+
+        def hook(d):
+            filename = d.get("filename")
+            downloaded = d.get("downloaded_bytes") or 0
+            # La primera vez que aparece un archivo solo se toma la base: un
+            # `.part` retomado informa bytes que no pasaron por la red ahora
+            previous = seen.get(filename, downloaded)
+            seen[filename] = downloaded
+            if downloaded > previous:
+                bandwidth._consume(downloaded - previous, cancel)
+            if forward is not None:
+                forward({**d, **bandwidth._status()})
+
+        return hook
+
+    def download(
+        self,
+        url: str,
+        folder_parts: Optional[tuple] = None,
+        cancel: Optional[threading.Event] = None,
+        songs: Optional[list] = None,
+    ) -> UrlResult:
+        """
+        Contrato:
+            Descarga una URL de Spotify o YouTube.
+        Precondiciones:
+            `url` debe pertenecer a una de las fuentes habilitadas.
+            `folder_parts` puede provenir de un plan para omitir la metadata.
+            `cancel` permite interrumpir la descarga desde otro hilo.
+            `songs` puede traer la metadata de Spotify resuelta junto con
+            `folder_parts`, para no buscarla de nuevo.
+        Postcondiciones:
+            Devuelve un `UrlResult` con estado `done`, `failed`, `cancelled` o `ignored`.
+            Registra y notifica cada etapa; nunca lanza por fallos de descarga.
+            En el diario, una cancelacion queda como `failed` para reintentarse.
+        """
+        source = _source_of(url)
+        if source not in self.sources:
+            self._emit(url, source, IGNORED)
+            return UrlResult(url, source, IGNORED)
+        if not self._check_dependencies(source):
+            error = "Faltan dependencias externas"
+            self._emit(url, source, journal.FAILED, error=error)
+            return UrlResult(url, source, journal.FAILED, error=error)
+
+        if cancel is not None and cancel.is_set():
+            self._emit(url, source, journal.FAILED, error="Cancelado")
+            return UrlResult(url, source, CANCELLED, error="Cancelado")
+
+        def on_state(state, **extra):
+            self._emit(url, source, state, **extra)
+
+        base_out = self.outdir
+        if self.staging_dir is not None:
+            base_out = staging._stage_dir(self.staging_dir, url)
+            base_out.mkdir(parents=True, exist_ok=True)
+
+        if source == SPOTIFY:
+            lease = self.bandwidth._lease(cancel) if self.bandwidth else nullcontext()
+            with lease as rate_limit:
+                outcome = funcionessp._download_album(
+                    url,
+                    folder_parts,
+                    on_state=on_state,
+                    quiet=not self.verbose,
+                    base_out=str(base_out),
+                    cancel=cancel,
+                    engine=self.spotdl_engine,
+                    rate_limit=rate_limit,
+                    songs=songs,
+                )
+        else:
+            session = self.bandwidth._session() if self.bandwidth else nullcontext()
+            with session:
+                outcome = funcionesyt._download_disc(
+                    url=url,
+                    base_out=base_out,
+                    kbps=self.kbps,
+                    cookies=self.cookies,
+                    proxy=self.proxy,
+                    rate_limit=self.rate_limit,
+                    no_warnings=self.no_warnings,
+                    no_playlist=self.no_playlist,
+                    folder_parts=folder_parts,
+                    on_state=on_state,
+                    progress_hook=self._progress_hook(url, cancel),
+                    quiet=not self.verbose,
+                    cancel=cancel,
+                    max_filesize=self.max_filesize,
+                    renditions=self.renditions,
+                )
+        if outcome["error"] and cancel is not None and cancel.is_set():
+            self._emit(url, source, journal.FAILED, error="Cancelado")
+            return UrlResult(url, source, CANCELLED, error="Cancelado")
+        if outcome["error"]:
+            self._emit(url, source, journal.FAILED, error=outcome["error"])
+            return UrlResult(url, source, journal.FAILED, error=outcome["error"])
+        folder, paths = outcome["folder"], outcome["tracks"]
+        folders = outcome.get("renditions") or {None: folder}
+        if self.replaygain and paths:
+            # Un calculo de disco por version; las etiquetas ReplayGain son ID3
+            tagged = 0
+            for rendition_folder in folders.values():
+                published = None
+                if self.staging_dir is not None:
+                    published = self.outdir / rendition_folder.relative_to(base_out)
+                mp3s = _album_mp3s(rendition_folder, published)
+                tagged += replaygain._tag_album(mp3s, self.replaygain_workers)
+            self._emit(url, source, "replaygain", tagged=tagged)
+        if self.staging_dir is not None:
+            try:
+                for rendition_folder in folders.values():
+                    staging._publish_album(
+                        rendition_folder, self.outdir / rendition_folder.relative_to(base_out)
+                    )
+            except OSError as e:
+                error = f"No se pudo publicar el disco: {e}"
+                self._emit(url, source, journal.FAILED, error=error)
+                return UrlResult(url, source, journal.FAILED, error=error)
+            paths = [self.outdir / path.relative_to(base_out) for path in paths]
+            folders = {
+                name: self.outdir / rendition_folder.relative_to(base_out)
+                for name, rendition_folder in folders.items()
+            }
+            folder = self.outdir / folder.relative_to(base_out)
+            shutil.rmtree(base_out, ignore_errors=True)
+        tracks = [TrackResult(path, path.stat().st_size) for path in paths]
+        fetched, saved = outcome.get("bytes_fetched", 0), outcome.get("bytes_saved", 0)
+        self._emit(
+            url, source, journal.DONE, folder=str(folder), bytes_fetched=fetched, bytes_saved=saved
+        )
+        renditions = {name: path for name, path in folders.items() if name is not None}
+        return UrlResult(url, source, journal.DONE, folder, tracks, None, fetched, saved, renditions)
+
+    def run(self, jobs: Iterable[Job]) -> List[UrlResult]:
+        """
+        Contrato:
+            Procesa secuencialmente una lista de trabajos.
+        Precondiciones:
+            `jobs` debe contener tuplas `(url, folder_parts)` o
+            `(url, folder_parts, songs)`.
+        Postcondiciones:
+            Devuelve un resultado por trabajo, en el mismo orden.
+            Las URLs de fuentes no habilitadas quedan como `ignored`.
+            Con `resume` y diario, las URLs terminadas quedan como `resumed`
+            sin volver a descargarse.
+        """
+        jobs = list(jobs)
+        finished = {}
+        if self.resume and self.journal_path is not None:
+            for source in self.sources:
+                states = journal._load_states(self.journal_path, source)
+                finished[source] = {
+                    url for url, record in states.items() if record["state"] == journal.DONE
+                }
+        results: List[Optional[UrlResult]] = [None] * len(jobs)
+        pending = []
+        for pos, (url, folder_parts, *rest) in enumerate(jobs):
+            songs = rest[0] if rest else None
+            source = _source_of(url)
+            if source not in self.sources:
+                self._emit(url, source, IGNORED)
+                results[pos] = UrlResult(url, source, IGNORED)
+            elif url in finished.get(source, ()):
+                self._emit(url, source, RESUMED)
+                results[pos] = UrlResult(url, source, RESUMED)
+            else:
+                pending.append((pos, url, folder_parts, songs, source))
+        for _, url, _, _, source in pending:
+            self._emit(url, source, journal.QUEUED)
+        # Un solo hilo de resolucion: adelanta la metadata sin sumar
+        # concurrencia contra la fuente mas alla de la descarga en curso.
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        prefetched = {}
+        try:
+            for index, (pos, url, folder_parts, songs, source) in enumerate(pending, 1):
+                if executor is not None:
+                    for ahead_pos, ahead_url, ahead_parts, _, ahead_source in pending[
+                        index : index + self.prefetch
+                    ]:
+                        if ahead_parts is None and ahead_pos not in prefetched:
+                            prefetched[ahead_pos] = executor.submit(
+                                self._prefetch_entry, ahead_url, ahead_source
+                            )
+                if pos in prefetched:
+                    entry = prefetched.pop(pos).result()
+                    if entry is not None:
+                        folder_parts, songs = _folder_parts(entry), entry.get("songs")
+                self._emit(url, source, "started", index=index, total=len(pending))
+                results[pos] = self.download(url, folder_parts, songs=songs)
+                if source == SPOTIFY and results[pos].ok:
+                    time.sleep(5)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    def download_many(self, urls: Iterable[str]) -> List[UrlResult]:
+        """
+        Contrato:
+            Descarga una lista de URLs resolviendo su metadata en el momento.
+        Postcondiciones:
+            Equivale a `run` con trabajos sin partes de carpeta.
+        """
+        return self.run((url, None) for url in urls)
+
+    def download_plan(
+        self, plan_path: Path, shard: Optional[tuple[int, int]] = None
+    ) -> List[UrlResult]:
+        """
+        Contrato:
+            Fase de descarga: ejecuta las entradas de un plan para las fuentes habilitadas.
+        Precondiciones:
+            `plan_path` debe apuntar a un plan generado por `resolve_to_plan`.
+            `shard` debe ser `None` o una tupla `(i, N)`.
+        Postcondiciones:
+            Descarga solo las entradas de este shard usando las carpetas del plan.
+            Propaga `FileNotFoundError`, `ValueError` o `json.JSONDecodeError`
+            si el plan no puede leerse.
+        """
+        jobs = [
+            (entry["url"], _folder_parts(entry), entry.get("songs"))
+            for entry in plan._load_shard(Path(plan_path), self.sources, shard)
+        ]
+        return self.run(jobs)
+
+    def _resolve_entry(self, url: str, source: str, quiet: bool) -> dict:
+        """
+        Contrato:
+            Obtiene la entrada de plan de una URL con el modulo de su fuente.
+        Postcondiciones:
+            Los temporales de `spotdl save` van al directorio de preparacion o
+            al de salida, no a `RAIZ`. Propaga las excepciones de la resolucion.
+        """
+        if source == SPOTIFY:
+            return funcionessp._resolve_plan_entry(
+                url,
+                quiet=quiet,
+                engine=self.spotdl_engine,
+                tmp_dir=str(self.staging_dir or self.outdir),
+            )
+        return funcionesyt._resolve_plan_entry(
+            url, self.kbps, cookies=self.cookies, proxy=self.proxy
+        )
+
+    def _prefetch_entry(self, url: str, source: str) -> Optional[dict]:
+        """
+        Contrato:
+            Resuelve por adelantado la entrada de plan de un trabajo pendiente.
+        Postcondiciones:
+            Devuelve la entrada (partes de carpeta y, en Spotify, la metadata
+            de los temas) o `None` si la resolucion falla; en ese caso la
+            descarga vuelve a resolver y reporta el error en su turno.
+            Registra `resolving` en el diario al empezar, como la descarga
+            cuando resuelve en su turno.
+        """
+        self._emit(url, source, journal.RESOLVING)
+        try:
+            return self._resolve_entry(url, source, quiet=True)
+        except Exception as e:
+            logging.warning(f"No se pudo adelantar la metadata de {url}: {e}")
+            return None
+
+    def resolve(self, url: str) -> tuple[UrlResult, Optional[dict]]:
+        """
+        Contrato:
+            Fase de resolucion de una URL: obtiene su entrada de plan sin descargar.
+        Postcondiciones:
+            Devuelve `(resultado, entrada)`; `entrada` es `None` si la URL se
+            ignora o falla.
+        """
+        source = _source_of(url)
+        if source not in self.sources:
+            return UrlResult(url, source, IGNORED), None
+        if not self._check_dependencies(source):
+            return UrlResult(url, source, journal.FAILED, error="Faltan dependencias externas"), None
+        self._emit(url, source, "planning")
+        try:
+            entry = self._resolve_entry(url, source, quiet=not self.verbose)
+        except Exception as e:
+            self._emit(url, source, "plan-failed", error=str(e))
+            return UrlResult(url, source, journal.FAILED, error=str(e)), None
+        self._emit(url, source, "planned", artist=entry["artist"], album=entry["album"])
+        return UrlResult(url, source, journal.DONE), entry
+
+    def resolve_to_plan(self, urls: Iterable[str], plan_path: Path) -> List[UrlResult]:
+        """
+        Contrato:
+            Fase de resolucion: guarda en un plan las URLs de las fuentes habilitadas.
+        Precondiciones:
+            `plan_path` debe ser una ruta escribible; puede contener entradas
+            de otras fuentes, que se conservan.
+        Postcondiciones:
+            Escribe una entrada por URL resuelta y devuelve un resultado por URL.
+        """
+        results = []
+        entries = {source: [] for source in self.sources}
+        for url in urls:
+            result, entry = self.resolve(url)
+            results.append(result)
+            if entry is not None:
+                entries[result.source].append(entry)
+        for source, source_entries in entries.items():
+            plan._write_plan(Path(plan_path), source_entries, source)
+        return results
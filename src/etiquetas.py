@@ -0,0 +1,120 @@
+# Etiquetas y portada escritas en la misma pasada de ffmpeg que convierte el audio
+
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP, FFmpegPostProcessorError
+from yt_dlp.utils import PostProcessingError, prepend_extension
+
+# Relleno de la cabecera ID3: deja lugar para que ReplayGain agregue sus frames
+# con `mutagen` sin insertar bytes ni mover el audio.
+ID3_PADDING = 4096
+
+
+def _track_tags(info: dict) -> dict:
+    """
+    Contrato:
+        Extrae de la metadata de `yt-dlp` las etiquetas de un tema.
+    Postcondiciones:
+        Devuelve titulo, artista, artista del disco, disco, numero de tema y de
+        disco, año, genero, compositor, descripcion y URL de origen (`comment`),
+        con las claves de ffmpeg y omitiendo los que no estan disponibles. Son
+        las mismas que escribia el postprocesador `FFmpegMetadata` de `yt-dlp`.
+    """
+    date = info.get("release_date") or info.get("upload_date")
+    tags = {
+        "title": info.get("track") or info.get("title"),
+        "artist": info.get("artist") or info.get("uploader") or info.get("channel"),
+        "album_artist": info.get("album_artist"),
+        "album": info.get("album") or info.get("playlist_title") or info.get("playlist"),
+        "track": info.get("track_number") or info.get("playlist_index"),
+        "disc": info.get("disc_number"),
+        "date": info.get("release_year") or (date[:4] if date else None),
+        "genre": info.get("genre") or ", ".join(info.get("genres") or []),
+        "composer": info.get("composer") or ", ".join(info.get("composers") or []),
+        "description": info.get("description"),
+        "comment": info.get("webpage_url"),
+    }
+    return {key: str(value) for key, value in tags.items() if value}
+
+
+def _metadata_args(info: dict) -> List[str]:
+    """
+    Contrato:
+        Traduce la metadata de `yt-dlp` a argumentos `-metadata` de ffmpeg.
+    Postcondiciones:
+        Usa las etiquetas de `_track_tags`.
+    """
+    args = []
+    for key, value in _track_tags(info).items():
+        args += ["-metadata", f"{key}={value}"]
+    return args
+
+
+def _cover_args(input_index: int) -> List[str]:
+    """
+    Argumentos de ffmpeg para embeber como portada el JPG de la entrada `input_index`.
+    """
+    return [
+        "-map", f"{input_index}:v:0", "-c:v", "copy", "-disposition:v:0", "attached_pic",
+        "-metadata:s:v", "title=Album cover", "-metadata:s:v", "comment=Cover (front)",
+    ]
+
+
+def _thumbnail_path(info: dict) -> Optional[Path]:
+    """
+    Devuelve la miniatura ya escrita en disco de un tema, o `None` si no hay.
+    """
+    return next(
+        (
+            Path(thumbnail["filepath"])
+            for thumbnail in reversed(info.get("thumbnails") or [])
+            if thumbnail.get("filepath") and Path(thumbnail["filepath"]).exists()
+        ),
+        None,
+    )
+
+
+class TaggedExtractAudioPP(FFmpegExtractAudioPP):
+    """
+    Conversion a MP3 de `yt-dlp` que, en la misma ejecucion de ffmpeg, escribe
+    las etiquetas de `_track_tags` y embebe la miniatura JPG como portada.
+
+    Reemplaza a `FFmpegExtractAudio` + `FFmpegMetadata` + `EmbedThumbnail`, que
+    reescribian el MP3 entero tres veces. La cabecera ID3v2.3 queda con
+    `ID3_PADDING` bytes libres para que ReplayGain tambien escriba en el lugar.
+    La miniatura debe convertirse a JPG antes de la descarga (`before_dl`).
+    Si el original ya es MP3, `yt-dlp` no lo convierte: en ese caso se copia
+    el audio sin recodificar en una sola pasada que agrega etiquetas y portada.
+    """
+
+    def run(self, information):
+        self._info = information
+        self._converted = False
+        # `__wrapped__` evita que los hooks de postproceso se informen dos veces
+        files_to_delete, information = FFmpegExtractAudioPP.run.__wrapped__(self, information)
+        if not self._converted and information.get("ext") == "mp3":
+            path = information["filepath"]
+            temp_path = prepend_extension(path, "temp")
+            self.to_screen(f"Agregando etiquetas y portada a {path}")
+            self.run_ffmpeg(path, temp_path, "copy", [])
+            os.replace(temp_path, path)
+        return files_to_delete, information
+
+    def run_ffmpeg(self, path, out_path, codec, more_opts):
+        self._converted = True
+        cover = _thumbnail_path(self._info)
+        inputs = [(path, [])]
+        opts = ["-map", "0:a:0"]
+        if cover is not None:
+            inputs.append((str(cover), []))
+            opts += _cover_args(1)
+        if codec is not None:
+            opts += ["-c:a", codec]
+        opts += [*more_opts, "-map_metadata", "-1", *_metadata_args(self._info)]
+        opts += ["-id3v2_version", "3", "-metadata_header_padding", str(ID3_PADDING)]
+        try:
+            self.real_run_ffmpeg(inputs, [(out_path, opts)])
+        except FFmpegPostProcessorError as err:
+            raise PostProcessingError(f"audio conversion failed: {err.msg}")
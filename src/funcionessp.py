@@ -2,17 +2,48 @@
 
 import logging
 import json
-from typing import List
+from typing import Callable, List, Optional
 import os
 from pathlib import Path
-import re
 import shutil
 import subprocess
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
+from src import journal, nombres, plan
+
+class Cancelled(Exception):
+    """
+    Se lanza cuando una descarga en curso se cancela desde afuera.
+    """
+
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 RAIZ = str(PROJECT_ROOT / "salida")
+# Bitrate por defecto de spotdl, usado para estimar tamaños en el plan.
+SPOTDL_KBPS = 128
+# Temas que spotdl descarga a la vez, cada uno con su propio `yt-dlp`.
+SPOTDL_THREADS = 2
+
+# Motores de spotdl: un proceso `spotdl` por comando, o la libreria en este proceso.
+SUBPROCESS_ENGINE = "subprocess"
+LIBRARY_ENGINE = "library"
+SPOTDL_ENGINES = (SUBPROCESS_ENGINE, LIBRARY_ENGINE)
+
+# Instancia compartida de `spotdl.Spotdl`. Se crea una sola vez por proceso (el
+# cliente de Spotify de spotdl es unico). spotdl ata su event loop al hilo que
+# lo crea, por eso la instancia se crea y cada descarga corre en un unico hilo
+# propio (`_library_thread`), que ademas las serializa. Las busquedas no usan
+# el event loop: corren en el hilo que las pide, de a una por
+# `_library_search_lock`, asi la resolucion anticipada puede buscar mientras
+# otro disco se descarga.
+_library = None
+_library_failed = False
+_library_init_lock = threading.Lock()
+_library_search_lock = threading.Lock()
+_library_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spotdl")
 
 
 def _is_spotify_url(url: str) -> bool:
@@ -31,43 +62,21 @@ def _is_spotify_url(url: str) -> bool:
     return host == "open.spotify.com" or host.endswith(".spotify.com")
 
 
-def _safe_dir_name(name: str, fallback: str = "Desconocido") -> str:
-    """
-    Contrato:
-        Convierte texto de metadata en un nombre seguro para directorio.
-    Precondiciones:
-        `name` puede ser una cadena vacia o valor falsy.
-    Postcondiciones:
-        Devuelve un nombre sin separadores ni caracteres invalidos de rutas.
-    """
-    if not name:
-        return fallback
-    name = re.sub(r'[\\/:*?"<>|]', " ", str(name))
-    name = re.sub(r"\s+", " ", name).strip()
-    return name or fallback
-
-
-def _safe_file_name(name: str, fallback: str = "tema.mp3") -> str:
+def _canonical_url(url: str) -> str:
     """
     Contrato:
-        Convierte texto de playlist en un nombre seguro para archivo.
+        Normaliza un enlace de Spotify a su forma web canonica.
     Precondiciones:
-        `name` puede ser una cadena vacia o valor falsy.
+        `url` debe ser un enlace aceptado por `_is_spotify_url`.
     Postcondiciones:
-        Devuelve un nombre sin separadores ni caracteres invalidos de rutas.
+        Convierte URIs `spotify:tipo:id` a `https://open.spotify.com/tipo/id`.
+        Quita parametros de consulta, fragmentos y prefijos de idioma `intl-xx`.
     """
-    if not name:
-        return fallback
-    name = re.sub(r'[\\/:*?"<>|]', "_", str(name))
-    name = re.sub(r"\s+", " ", name).strip()
-    return name or fallback
-
-
-def _clean_album_name(name: str) -> str:
-    """
-    Quita el prefijo descriptivo agregado por algunas fuentes de metadata.
-    """
-    return re.sub(r"^Album\s*-\s*", "", str(name), flags=re.IGNORECASE).strip()
+    if url.startswith("spotify:"):
+        return "https://open.spotify.com/" + "/".join(url.split(":")[1:])
+    parsed = urlparse(url)
+    parts = [part for part in parsed.path.split("/") if part and not part.startswith("intl-")]
+    return f"https://open.spotify.com/{'/'.join(parts)}"
 
 
 def _check_dependencies() -> bool:
@@ -97,44 +106,170 @@ def _spotdl_program() -> str:
     return shutil.which("spotdl") or "spotdl"
 
 
-def _run_spotdl_command(command: List[str]):
+def _run_spotdl_command(
+    command: List[str],
+    cwd: Optional[str] = None,
+    quiet: bool = False,
+    cancel: Optional[threading.Event] = None,
+):
     """
     Contrato:
         Ejecuta un comando externo asociado a `spotdl`.
     Precondiciones:
         `command` debe ser una lista no vacia con el ejecutable en la primera posicion.
         El ejecutable indicado debe existir y tener permisos de ejecucion.
+        Si se informa `cwd`, debe ser un directorio existente.
     Postcondiciones:
+        Ejecuta el comando en `cwd` sin cambiar el directorio del proceso actual.
+        Con `quiet`, descarta la salida estandar de `spotdl`.
+        Si `cancel` se activa mientras corre, termina el proceso y lanza `Cancelled`.
         Si el comando termina correctamente, la funcion finaliza sin devolver valor.
         Si el comando falla, registra el error y relanza `CalledProcessError`.
     """
     try:
         logging.info(f"Ejecutando spotdl con el comando: {command}")
-        subprocess.run(command, check=True)
+        with subprocess.Popen(
+            command, cwd=cwd, stdout=subprocess.DEVNULL if quiet else None
+        ) as process:
+            while True:
+                try:
+                    returncode = process.wait(timeout=0.5)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel is not None and cancel.is_set():
+                        process.terminate()
+                        process.wait()
+                        raise Cancelled("Descarga cancelada")
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, command)
     except subprocess.CalledProcessError as e:
         logging.error(f"Error al ejecutar spotdl: {e}")
         raise
 
 
-def _get_album_info(url: str) -> dict:
+def _create_library():
+    """
+    Crea la instancia de `spotdl.Spotdl`; debe ejecutarse en `_library_thread`.
+    """
+    from spotdl import Spotdl
+    from spotdl.utils.config import DEFAULT_CONFIG
+
+    return Spotdl(
+        client_id=DEFAULT_CONFIG["client_id"],
+        client_secret=DEFAULT_CONFIG["client_secret"],
+        downloader_settings={"threads": SPOTDL_THREADS},
+    )
+
+
+def _spotdl_library():
     """
     Contrato:
-        Obtiene metadata del album o playlist de Spotify usando `spotdl save`.
+        Devuelve el motor de `spotdl` en proceso, creandolo la primera vez.
+    Precondiciones:
+        El paquete `spotdl` debe poder importarse en el entorno actual.
+    Postcondiciones:
+        Devuelve la instancia compartida de `spotdl.Spotdl`, con una sola
+        autenticacion y un solo buscador de YouTube para toda la ejecucion,
+        creada en `_library_thread` para que su event loop quede en ese hilo.
+        Si no puede iniciarse, lo registra una vez y devuelve `None` para que
+        los llamadores usen el comando `spotdl` como respaldo.
+    """
+    global _library, _library_failed
+    with _library_init_lock:
+        if _library is None and not _library_failed:
+            try:
+                _library = _library_thread.submit(_create_library).result()
+                logging.info("Motor de spotdl iniciado en este proceso")
+            except Exception as e:
+                _library_failed = True
+                logging.warning(f"No se pudo usar spotdl como librería, se usa el comando: {e}")
+        return _library
+
+
+def _library_download(
+    library,
+    url: str,
+    songs: Optional[List[dict]],
+    album_dir: str,
+    rate_limit: Optional[int] = None,
+):
+    """
+    Contrato:
+        Descarga los temas de un album con el motor de `spotdl` en proceso.
+    Precondiciones:
+        `library` debe ser la instancia devuelta por `_spotdl_library`.
+        `songs` puede traer la metadata ya obtenida de `url`; si es `None` se busca.
+        `album_dir` debe ser un directorio existente.
+        `rate_limit`, en bytes/s, limita el `yt-dlp` interno de `spotdl`.
+    Postcondiciones:
+        Guarda los MP3 en `album_dir` con el mismo nombre que usa el comando.
+        La descarga corre en `_library_thread`, el hilo del event loop de
+        `spotdl`, aunque se llame desde otro hilo.
+        Lanza `RuntimeError` si ningun tema pudo descargarse.
+    """
+    from spotdl.types.song import Song
+
+    if songs is None:
+        with _library_search_lock:
+            song_objects = library.search([url])
+    else:
+        song_objects = [Song.from_dict(song) for song in songs]
+
+    def _download():
+        library.downloader.settings["output"] = os.path.join(
+            album_dir, "{artists} - {title}.{output-ext}"
+        )
+        # `spotdl` crea su `yt-dlp` por tema leyendo esta opcion
+        library.downloader.settings["yt_dlp_args"] = (
+            f"--limit-rate {rate_limit}" if rate_limit else None
+        )
+        return library.download_songs(song_objects)
+
+    results = _library_thread.submit(_download).result()
+    failed = [song.display_name for song, path in results if path is None]
+    for name in failed:
+        logging.warning(f"spotdl no pudo descargar: {name}")
+    if results and len(failed) == len(results):
+        raise RuntimeError("spotdl no descargó ningún tema")
+
+
+def _get_album_songs(
+    url: str,
+    quiet: bool = False,
+    engine: str = SUBPROCESS_ENGINE,
+    tmp_dir: Optional[str] = None,
+) -> List[dict]:
+    """
+    Contrato:
+        Obtiene la metadata de todos los temas de un album o playlist usando `spotdl save`.
     Precondiciones:
         `url` debe ser una URL aceptada por `spotdl`.
-        `RAIZ` debe poder crearse para escribir el archivo temporal `datos.spotdl`.
+        `tmp_dir` (por defecto `RAIZ`) debe poder crearse para escribir un
+        archivo temporal `datos-*.spotdl`.
+        Con `quiet`, `spotdl` no escribe en consola.
+        Con `engine` igual a `library`, busca con el motor en proceso sin
+        archivo temporal; si no esta disponible, usa el comando.
     Postcondiciones:
-        Devuelve el primer objeto de metadata del archivo generado por `spotdl`.
+        Devuelve la lista de objetos de metadata del archivo generado por `spotdl`.
         Intenta eliminar el archivo temporal antes de finalizar.
         Si la metadata no puede leerse, registra el error y relanza la excepcion.
     """
-    output_file = os.path.join(RAIZ, "datos.spotdl")
+    library = _spotdl_library() if engine == LIBRARY_ENGINE else None
+    if library is not None:
+        with _library_search_lock:
+            return [song.json for song in library.search([url])]
+
+    # Nombre unico para que varias descargas simultaneas no compartan el temporal
+    tmp_dir = tmp_dir or RAIZ
+    output_file = os.path.join(tmp_dir, f"datos-{uuid.uuid4().hex}.spotdl")
     try:
-        os.makedirs(RAIZ, exist_ok=True)
-        _run_spotdl_command([_spotdl_program(), "save", url, "--save-file", output_file])
+        os.makedirs(tmp_dir, exist_ok=True)
+        _run_spotdl_command(
+            [_spotdl_program(), "save", url, "--save-file", output_file], quiet=quiet
+        )
         time.sleep(5)
         with open(output_file, "r", encoding="utf-8") as f:
-            return json.load(f)[0]
+            return json.load(f)
     except (
         subprocess.CalledProcessError,
         FileNotFoundError,
@@ -150,6 +285,77 @@ def _get_album_info(url: str) -> dict:
             pass
 
 
+def _get_album_info(url: str, quiet: bool = False, engine: str = SUBPROCESS_ENGINE) -> dict:
+    """
+    Contrato:
+        Obtiene metadata del album o playlist de Spotify usando `spotdl save`.
+    Precondiciones:
+        Las mismas que `_get_album_songs`.
+    Postcondiciones:
+        Devuelve el primer objeto de metadata del archivo generado por `spotdl`.
+        Lanza `IndexError` si `spotdl` no devolvio ningun tema.
+    """
+    return _get_album_songs(url, quiet, engine)[0]
+
+
+def _album_folder_parts(album_info: dict) -> tuple[str, str]:
+    """
+    Contrato:
+        Deriva los nombres de carpeta de artista y disco desde la metadata.
+    Precondiciones:
+        `album_info` debe ser un objeto de metadata devuelto por `spotdl`.
+    Postcondiciones:
+        Devuelve la tupla `(artist, album)` con nombres seguros para directorio.
+    """
+    artist = nombres._safe_dir_name(album_info.get("album_artist"), "Artista desconocido")
+    album = nombres._safe_dir_name(
+        nombres._clean_album_name(album_info.get("album_name") or ""),
+        "Disco desconocido",
+    )
+    return artist, album
+
+
+def _resolve_plan_entry(
+    url: str,
+    quiet: bool = False,
+    engine: str = SUBPROCESS_ENGINE,
+    tmp_dir: Optional[str] = None,
+) -> dict:
+    """
+    Contrato:
+        Resuelve una URL de Spotify en una entrada de plan descargable luego.
+    Precondiciones:
+        `url` debe ser una URL de Spotify aceptada por `spotdl`.
+    Postcondiciones:
+        Devuelve un diccionario con URL canonica, fuente, artista, disco y
+        la lista de temas con su tamaño estimado al bitrate de `spotdl`.
+        Con el motor en proceso agrega `songs`, la metadata completa de
+        `spotdl`, para no buscarla otra vez al descargar; el comando no la
+        usa, asi que no se guarda y el plan no crece.
+        `tmp_dir` se pasa a `_get_album_songs`.
+        Propaga las excepciones de `_get_album_songs`.
+    """
+    songs = _get_album_songs(url, quiet, engine, tmp_dir=tmp_dir)
+    artist, album = _album_folder_parts(songs[0])
+    tracks = [
+        {
+            "title": song.get("name"),
+            "duration": song.get("duration"),
+            "estimated_bytes": plan._estimate_track_bytes(song.get("duration"), SPOTDL_KBPS),
+        }
+        for song in songs
+    ]
+    return {
+        "url": _canonical_url(url),
+        "source": "spotify",
+        "artist": artist,
+        "album": album,
+        "tracks": tracks,
+        "estimated_bytes": sum(track["estimated_bytes"] for track in tracks),
+        **({"songs": songs} if engine == LIBRARY_ENGINE else {}),
+    }
+
+
 def _rename_mp3_from_playlist(album_dir: str, playlist_path: str):
     """
     Contrato:
@@ -160,35 +366,72 @@ def _rename_mp3_from_playlist(album_dir: str, playlist_path: str):
         La playlist debe contener entradas `#EXTINF` seguidas por rutas de audio.
     Postcondiciones:
         Para cada pista encontrada, intenta renombrar el archivo correspondiente.
+        Si dos temas quedan con el mismo nombre, el primero en orden de playlist
+        lo conserva y el segundo recibe un sufijo ` (2)` en lugar de
+        sobrescribir al primero; un archivo ajeno a la playlist nunca se pisa.
         Registra advertencias si no encuentra el archivo esperado.
         No devuelve valor.
     """
     album_path = Path(album_dir)
     with open(playlist_path, "r", encoding="utf-8") as f:
         lines = [l.strip() for l in f if l.strip()]
+    entries = []
     for idx, line in enumerate(lines):
-        if line.startswith("#EXTINF"):
-            if idx + 1 < len(lines):
-                file_rel = lines[idx + 1]
-                file_name = Path(file_rel).name
-                if not file_name:
-                    continue
-                candidates = [
-                    album_path / file_name,
-                    album_path / file_name.replace(" ", "_"),
-                ]
-                old_path = next((path for path in candidates if path.exists()), None)
-                if old_path is None:
-                    logging.warning(f"No se encontró el archivo de audio listado: {file_rel}")
-                    continue
-                new_path = album_path / _safe_file_name(file_name)
-                if old_path == new_path:
-                    continue
-                try:
-                    old_path.rename(new_path)
-                    logging.info(f"Renombrado {old_path} → {new_path}")
-                except Exception as e:
-                    logging.error(f"Error al renombrar {old_path}: {e}")
+        if not line.startswith("#EXTINF") or idx + 1 >= len(lines):
+            continue
+        file_rel = lines[idx + 1]
+        file_name = Path(file_rel).name
+        if not file_name:
+            continue
+        candidates = [
+            album_path / file_name,
+            album_path / file_name.replace(" ", "_"),
+        ]
+        old_path = next((path for path in candidates if path.exists()), None)
+        if old_path is None:
+            logging.warning(f"No se encontró el archivo de audio listado: {file_rel}")
+            continue
+        if all(old_path != entry[0] for entry in entries):
+            entries.append((old_path, file_name))
+
+    # Los nombres de los temas de la playlist se reparten de nuevo en su orden;
+    # solo los archivos ajenos a ella quedan reservados de antemano.
+    moving = {nombres._collision_key(old_path.name) for old_path, _ in entries}
+    taken = {
+        nombres._collision_key(item.name)
+        for item in album_path.iterdir()
+        if nombres._collision_key(item.name) not in moving
+    }
+    renames = []
+    for old_path, file_name in entries:
+        new_name = nombres._fit_file_name(album_path, nombres._safe_file_name(file_name))
+        new_path = album_path / nombres._unique_name(new_name, taken)
+        if old_path != new_path:
+            renames.append((old_path, new_path))
+
+    # Dos pasos: un tema puede ir al nombre que otro todavia ocupa.
+    staged = []
+    for index, (old_path, new_path) in enumerate(renames):
+        tmp_path = album_path / f".renombrando-{uuid.uuid4().hex}-{index}.mp3"
+        try:
+            old_path.rename(tmp_path)
+            staged.append((old_path, tmp_path, new_path))
+        except Exception as e:
+            logging.error(f"Error al renombrar {old_path}: {e}")
+    for old_path, tmp_path, new_path in staged:
+        if new_path.exists():
+            # Lo ocupa un tema que no pudo moverse: se busca otro nombre libre
+            in_use = {nombres._collision_key(item.name) for item in album_path.iterdir()}
+            new_path = album_path / nombres._unique_name(new_path.name, in_use)
+        try:
+            tmp_path.rename(new_path)
+            logging.info(f"Renombrado {old_path} → {new_path}")
+        except Exception as e:
+            logging.error(f"Error al renombrar {old_path}: {e}")
+            try:
+                tmp_path.rename(old_path)
+            except OSError:
+                pass
 
 
 def _procesar_playlist_y_renombrar(album_dir: str):
@@ -211,7 +454,36 @@ def _procesar_playlist_y_renombrar(album_dir: str):
                 logging.info(f"Playlist procesada: {playlist_path}")
 
 
-def _download_album(url: str) -> bool:
+def _recent_mp3_files(album_dir: str, started_at: float, known_files: set[Path]) -> List[Path]:
+    """
+    Contrato:
+        Lista los archivos MP3 que una descarga produjo o actualizo.
+    Precondiciones:
+        `album_dir` debe ser un directorio existente.
+        `started_at` debe ser el timestamp tomado antes de iniciar la descarga.
+        `known_files` debe contener los MP3 existentes antes de iniciar la descarga.
+    Postcondiciones:
+        Devuelve, ordenados por nombre, los MP3 nuevos o modificados durante la descarga.
+    """
+    current_files = {path for path in Path(album_dir).glob("*.mp3") if path.is_file()}
+    return sorted(
+        path
+        for path in current_files
+        if path not in known_files or path.stat().st_mtime >= started_at
+    )
+
+
+def _download_album(
+    url: str,
+    folder_parts: Optional[tuple[str, str]] = None,
+    on_state: Optional[Callable[..., None]] = None,
+    quiet: bool = False,
+    base_out: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+    engine: str = SUBPROCESS_ENGINE,
+    rate_limit: Optional[int] = None,
+    songs: Optional[List[dict]] = None,
+) -> dict:
     """
     Contrato:
         Descarga un album o playlist de Spotify y procesa sus archivos resultantes.
@@ -219,87 +491,73 @@ def _download_album(url: str) -> bool:
         `url` debe ser una URL aceptada por `spotdl`.
         `RAIZ` debe existir o poder crearse para crear directorios de artista y album.
         El comando `spotdl` configurado debe estar disponible.
+        Si se informa `folder_parts` (por ejemplo desde un plan), se usa como
+        `(artista, disco)` y se omite la consulta de metadata.
+        Si se informa `on_state`, se llama como `on_state(estado, **datos)` al
+        entrar en cada etapa del diario (`resolving`, `downloading`, ...).
+        Con `quiet`, `spotdl` no escribe en consola.
+        `base_out` reemplaza a `RAIZ` como carpeta base de la biblioteca.
+        Si `cancel` se activa, la descarga de `spotdl` se interrumpe.
+        `engine` elige entre el comando `spotdl` y el motor en proceso; este
+        ultimo reutiliza la metadata ya buscada y no puede interrumpirse a mitad.
+        `rate_limit`, en bytes/s, es el limite total del album: se reparte como
+        `--limit-rate` entre los `yt-dlp` de `spotdl` y queda fijo hasta el final.
+        `songs` puede traer la metadata ya resuelta junto con `folder_parts`
+        (plan o resolucion anticipada); el motor en proceso la usa sin buscar.
     Postcondiciones:
         Crea el directorio de destino si no existe.
-        Ejecuta la descarga con `spotdl`.
+        Ejecuta la descarga con `spotdl` dentro de ese directorio, sin cambiar
+        el directorio de trabajo del proceso.
         Intenta procesar playlists generadas para renombrar MP3.
-        Restaura el directorio de trabajo a `RAIZ` al finalizar.
-        Devuelve True si el flujo del album finaliza sin excepciones.
+        Devuelve un diccionario con `folder` (el directorio del album o `None`),
+        `tracks` (los MP3 nuevos o actualizados) y `error` (`None` si hubo exito).
     """
+    on_state = on_state or (lambda state, **extra: None)
     try:
-        album_info = _get_album_info(url)
-        artist = _safe_dir_name(album_info.get("album_artist"), "Artista desconocido")
-        album = _safe_dir_name(
-            _clean_album_name(album_info.get("album_name") or ""),
-            "Disco desconocido",
-        )
-        album_dir = os.path.join(RAIZ, artist, album)
-        print(album_dir)
+        if folder_parts is None:
+            on_state(journal.RESOLVING)
+            songs = _get_album_songs(url, quiet, engine, tmp_dir=base_out)
+            artist, album = _album_folder_parts(songs[0])
+        else:
+            artist = nombres._safe_dir_name(folder_parts[0], "Artista desconocido")
+            album = nombres._safe_dir_name(folder_parts[1], "Disco desconocido")
+        album_dir = os.path.join(base_out or RAIZ, artist, album)
 
         os.makedirs(album_dir, exist_ok=True)
         logging.info(f"Directorio creado: {album_dir}")
 
-        os.chdir(album_dir)
-        _run_spotdl_command([_spotdl_program(), "download", url, "--threads", "2"])
+        known_mp3_files = {path for path in Path(album_dir).glob("*.mp3") if path.is_file()}
+        started_at = time.time()
+        on_state(journal.DOWNLOADING, folder=album_dir)
+        if rate_limit:
+            # `--limit-rate` vale por cada `yt-dlp`: se reparte entre los hilos
+            rate_limit = max(1, rate_limit // SPOTDL_THREADS)
+            logging.info(f"Límite de spotdl: {rate_limit} B/s por tema")
+        library = _spotdl_library() if engine == LIBRARY_ENGINE else None
+        if library is not None:
+            if cancel is not None and cancel.is_set():
+                raise Cancelled("Descarga cancelada")
+            _library_download(library, url, songs, album_dir, rate_limit)
+        else:
+            command = [_spotdl_program(), "download", url, "--threads", str(SPOTDL_THREADS)]
+            if rate_limit:
+                command += ["--yt-dlp-args", f"--limit-rate {rate_limit}"]
+            _run_spotdl_command(command, cwd=album_dir, quiet=quiet, cancel=cancel)
+            time.sleep(5)  # Espera a que terminen de generarse los archivos
         logging.info("Descarga completada")
-        time.sleep(5)  # Espera a que terminen de generarse los archivos
 
         # *** NUEVO: procesar playlist y renombrar los mp3 ***
+        on_state(journal.POST_PROCESSING)
         _procesar_playlist_y_renombrar(album_dir)
-        return True
+        return {
+            "folder": Path(album_dir),
+            "tracks": _recent_mp3_files(album_dir, started_at, known_mp3_files),
+            "error": None,
+        }
 
     except Exception as e:
         logging.error(f"Error al descargar el álbum: {e}")
-        return False
-    finally:
-        os.chdir(RAIZ)
-
-
-def _descargar_discos_desde_archivo(archivo_discos: str) -> dict:
-    """
-    Contrato:
-        Descarga secuencialmente discos de Spotify listados en un archivo.
-    Precondiciones:
-        `archivo_discos` debe apuntar a un archivo de texto legible.
-        Cada linea no vacia puede contener una URL; solo se procesan las de Spotify.
-    Postcondiciones:
-        Intenta descargar cada URL de Spotify del archivo en orden.
-        Registra errores de archivo inexistente o fallos generales.
-        Devuelve un resumen con totales de links procesados, exitosos, fallidos e ignorados.
-    """
-    resumen = {"procesados": 0, "ok": 0, "fallidos": 0, "ignorados": 0}
-    try:
-        spotify_urls = []
-        with open(archivo_discos, "r", encoding="utf-8") as f:
-            for disco_url in f:
-                disco_url = disco_url.strip()
-                if not disco_url or disco_url.startswith("#"):
-                    continue
-                if not _is_spotify_url(disco_url):
-                    resumen["ignorados"] += 1
-                    logging.info(f"Link ignorado por no ser de Spotify: {disco_url}")
-                    continue
-                spotify_urls.append(disco_url)
-        if spotify_urls and not _check_dependencies():
-            resumen["fallidos"] = len(spotify_urls)
-            resumen["procesados"] = len(spotify_urls)
-            return resumen
-        for disco_url in spotify_urls:
-            resumen["procesados"] += 1
-            if not _download_album(disco_url):
-                resumen["fallidos"] += 1
-            else:
-                resumen["ok"] += 1
-                time.sleep(5)
-        return resumen
-    except FileNotFoundError:
-        logging.error(f"No se encontró el archivo: {archivo_discos}")
-        resumen["fallidos"] += 1
-        return resumen
-    except Exception as e:
-        logging.error(f"Error al procesar el archivo: {e}")
-        resumen["fallidos"] += 1
-        return resumen
+        return {"folder": None, "tracks": [], "error": str(e)}
 
 
 def _limpiar_archivos_m3u():
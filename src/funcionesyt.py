@@ -1,13 +1,15 @@
 # Funciones de descarga para YouTube Music
 
-import re
+import argparse
 import shutil
+import threading
 import time
-import unicodedata
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Callable, Iterable, Optional
 from urllib.parse import urlparse
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadCancelled, parse_bytes
+from src import ancho_banda, etiquetas, journal, nombres, plan, renditions as renditions_mod
 
 
 def _check_dependencies() -> bool:
@@ -72,59 +74,6 @@ def _read_youtube_urls(links_path: Path) -> Iterable[str]:
             yield url
 
 
-def _normalize_unicode(s: str) -> str:
-    """
-    Contrato:
-        Normaliza una cadena y remueve marcas diacriticas combinadas.
-    Precondiciones:
-        `s` debe ser una cadena de texto.
-    Postcondiciones:
-        Devuelve una cadena normalizada en forma NFKD sin diacriticos combinados.
-        No modifica la cadena original.
-    """
-    s = unicodedata.normalize("NFKD", s)
-    # Mantén letras y espacios, quita diacríticos combinados
-    return "".join(c for c in s if not unicodedata.combining(c))
-
-
-def _slugify(name: str, maxlen: int = 120) -> str:
-    """
-    Contrato:
-        Convierte un texto en un nombre seguro para carpeta.
-    Precondiciones:
-        `name` debe ser una cadena o un valor falsy aceptable.
-        `maxlen` debe ser un entero positivo.
-    Postcondiciones:
-        Devuelve un nombre sin caracteres conflictivos de rutas.
-        Compacta espacios, limita la longitud y evita nombres reservados comunes.
-    """
-    if not name:
-        return "Desconocido"
-    name = _normalize_unicode(name)
-    # Remplazo de caracteres problemáticos en rutas
-    name = re.sub(r'[\\/:*?"<>|]', " ", name)
-    # Compactar espacios
-    name = re.sub(r"\s+", " ", name).strip()
-    if len(name) > maxlen:
-        name = name[:maxlen].rstrip()
-    # Evitar nombres reservados en Windows
-    reserved = (
-        {"CON", "PRN", "AUX", "NUL"}
-        | {f"COM{i}" for i in range(1, 10)}
-        | {f"LPT{i}" for i in range(1, 10)}
-    )
-    if name.upper() in reserved:
-        name = f"_{name}_"
-    return name or "Desconocido"
-
-
-def _clean_album_name(name: str) -> str:
-    """
-    Quita el prefijo descriptivo agregado por algunas fuentes de metadata.
-    """
-    return re.sub(r"^Album\s*-\s*", "", str(name), flags=re.IGNORECASE).strip()
-
-
 def _probe_info(
     url: str, cookies: Optional[str] = None, proxy: Optional[str] = None
 ) -> dict:
@@ -148,34 +97,91 @@ def _probe_info(
         return ydl.extract_info(url, download=False)
 
 
-def _build_postprocessors(kbps: int):
+def _build_postprocessors():
     """
     Contrato:
-        Construye la cadena de postprocesadores de `yt-dlp`.
+        Construye la cadena de postprocesadores configurables de `yt-dlp`.
     Precondiciones:
-        `kbps` debe representar una calidad MP3 valida para FFmpeg.
         `ffmpeg` debe estar disponible cuando los postprocesadores se ejecuten.
     Postcondiciones:
-        Devuelve una lista de configuraciones para convertir a MP3, convertir
-        miniaturas, embeber portada y escribir metadata.
+        Devuelve la conversion de miniaturas a JPG antes de la descarga, para
+        que la conversion del audio (`etiquetas.TaggedExtractAudioPP` o
+        `renditions.RenditionsPP`, agregados en `_download_disc`) embeba la
+        portada y escriba las etiquetas en la misma pasada de ffmpeg.
     """
-    return [
-        {
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": "mp3",
-            "preferredquality": str(kbps),
-        },
-        {
-            "key": "FFmpegThumbnailsConvertor",
-            "format": "jpg",
-        },
-        {
-            "key": "EmbedThumbnail",
-        },
-        {
-            "key": "FFmpegMetadata",
-        },
+    return [{"key": "FFmpegThumbnailsConvertor", "format": "jpg", "when": "before_dl"}]
+
+
+def _parse_size(value: str) -> int:
+    """
+    Contrato:
+        Convierte un tamaño de la CLI (`50M`, `800K`, `1.5G`) a bytes.
+    Postcondiciones:
+        Devuelve un entero positivo o lanza `argparse.ArgumentTypeError`.
+    """
+    size = parse_bytes(value)
+    if not size or size <= 0:
+        raise argparse.ArgumentTypeError(f"tamaño invalido: {value!r} (ej.: 50M)")
+    return size
+
+
+def _audio_format_selector(kbps: int, max_filesize: Optional[int] = None) -> str:
+    """
+    Contrato:
+        Construye el selector de formato de `yt-dlp` segun el bitrate de destino.
+    Precondiciones:
+        `kbps` debe ser el bitrate MP3 final.
+        `max_filesize`, si se informa, es el tope en bytes por tema.
+    Postcondiciones:
+        Prefiere el audio mas chico con bitrate igual o apenas superior a `kbps`
+        (recodificar desde mas arriba solo descarga bytes que se descartan).
+        Si ninguno alcanza, usa el mejor audio disponible. Con `max_filesize`,
+        los formatos que lo superan quedan para el final, y si ninguno entra se
+        elige el audio mas chico.
+    """
+    if max_filesize:
+        # `<?` acepta formatos sin tamaño informado en lugar de descartarlos
+        cap = f"[filesize<?{max_filesize}][filesize_approx<?{max_filesize}]"
+        return f"wa[abr>={kbps}]{cap}/ba{cap}/wa/w"
+    return f"wa[abr>={kbps}]/ba/b"
+
+
+def _format_bytes(fmt: dict, duration: Optional[float]) -> int:
+    """
+    Contrato:
+        Obtiene o estima el tamaño de un formato de `yt-dlp`.
+    Postcondiciones:
+        Usa `filesize`, luego `filesize_approx` y por ultimo `abr * duracion`;
+        devuelve 0 si no hay datos para estimarlo.
+    """
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    bitrate = fmt.get("abr") or fmt.get("tbr")
+    if bitrate and duration:
+        return int(bitrate * 1000 / 8 * duration)
+    return 0
+
+
+def _bestaudio_bytes(info: dict) -> int:
+    """
+    Contrato:
+        Estima cuantos bytes hubiera descargado `bestaudio` para un tema.
+    Precondiciones:
+        `info` debe ser el diccionario de un tema con su lista `formats`.
+    Postcondiciones:
+        Devuelve el tamaño del formato solo-audio de mayor bitrate, o 0 si el
+        tema no informa formatos de audio.
+    """
+    audio = [
+        fmt
+        for fmt in info.get("formats") or []
+        if fmt.get("vcodec") == "none" and fmt.get("acodec") not in (None, "none")
     ]
+    if not audio:
+        return 0
+    best = max(audio, key=lambda fmt: fmt.get("abr") or fmt.get("tbr") or 0)
+    return _format_bytes(best, info.get("duration"))
 
 
 def _build_common_opts(
@@ -186,6 +192,8 @@ def _build_common_opts(
     rate_limit: Optional[str],
     no_warnings: bool,
     no_playlist: bool,
+    max_filesize: Optional[int] = None,
+    renditions: Optional[list] = None,
 ) -> dict:
     """
     Contrato:
@@ -196,15 +204,16 @@ def _build_common_opts(
         Si se informan `cookies`, `proxy` o `rate_limit`, deben ser valores validos.
     Postcondiciones:
         Devuelve un diccionario de opciones listo para instanciar `YoutubeDL`.
+        El formato se elige con `_audio_format_selector(kbps, max_filesize)`.
+        No incluye la conversion del audio: `_download_disc` agrega
+        `etiquetas.TaggedExtractAudioPP` o, con `renditions`, `renditions.RenditionsPP`.
         Incluye opciones condicionales solo cuando sus argumentos fueron provistos.
     """
     opts = {
-        "format": "bestaudio/best",
+        "format": _audio_format_selector(kbps, max_filesize),
         "outtmpl": outtmpl,
-        "postprocessors": _build_postprocessors(kbps),
+        "postprocessors": _build_postprocessors(),
         "writethumbnail": True,
-        "addmetadata": True,
-        "embedthumbnail": True,
         "ignoreerrors": True,
         "continuedl": True,
         "quiet": False,
@@ -235,7 +244,7 @@ def _compose_folder_parts(info_dict):
         Devuelve una tupla `(artist_name, album_title, is_playlist)`.
         Usa valores por defecto cuando no encuentra artista o album.
     """
-    album_title = _clean_album_name(
+    album_title = nombres._clean_album_name(
         info_dict.get("playlist_title") or info_dict.get("title") or "Unknown Album"
     )
 
@@ -271,6 +280,45 @@ def _compose_folder_parts(info_dict):
     return artist_name, album_title, is_playlist
 
 
+def _resolve_plan_entry(
+    url: str,
+    kbps: int,
+    cookies: Optional[str] = None,
+    proxy: Optional[str] = None,
+) -> dict:
+    """
+    Contrato:
+        Resuelve una URL de YouTube en una entrada de plan descargable luego.
+    Precondiciones:
+        `url` debe ser aceptada por `yt-dlp`.
+        `kbps` debe ser el bitrate MP3 con el que se descargara el plan.
+    Postcondiciones:
+        Devuelve un diccionario con URL canonica, fuente, artista, disco, si es
+        playlist y la lista de temas con su tamaño estimado a `kbps`.
+        Propaga las excepciones de `_probe_info`.
+    """
+    info = _probe_info(url, cookies=cookies, proxy=proxy)
+    artist_name, album_title, is_playlist = _compose_folder_parts(info)
+    entries = [entry for entry in (info.get("entries") or []) if entry] or [info]
+    tracks = [
+        {
+            "title": entry.get("title"),
+            "duration": entry.get("duration"),
+            "estimated_bytes": plan._estimate_track_bytes(entry.get("duration"), kbps),
+        }
+        for entry in entries
+    ]
+    return {
+        "url": info.get("webpage_url") or url,
+        "source": "youtube",
+        "artist": artist_name,
+        "album": album_title,
+        "is_playlist": is_playlist,
+        "tracks": tracks,
+        "estimated_bytes": sum(track["estimated_bytes"] for track in tracks),
+    }
+
+
 def _rename_thumbnails_to_cover(folder: Path):
     """
     Contrato:
@@ -295,22 +343,53 @@ def _rename_thumbnails_to_cover(folder: Path):
                 pass
 
 
-def _has_recent_mp3_files(folder: Path, started_at: float, known_files: set[Path]) -> bool:
+def _recent_mp3_files(folder: Path, started_at: float, known_files: set[Path]) -> list[Path]:
     """
     Contrato:
-        Determina si una descarga produjo o actualizo archivos MP3.
+        Lista los archivos MP3 que una descarga produjo o actualizo.
     Precondiciones:
         `folder` debe ser una ruta de directorio existente o esperada.
         `started_at` debe ser el timestamp tomado antes de iniciar la descarga.
         `known_files` debe contener los MP3 existentes antes de iniciar la descarga.
     Postcondiciones:
-        Devuelve True si hay al menos un MP3 nuevo o modificado durante la descarga.
+        Devuelve, ordenados por nombre, los MP3 nuevos o modificados durante la descarga.
     """
     current_files = {path for path in folder.glob("*.mp3") if path.is_file()}
-    new_files = current_files - known_files
-    if new_files:
-        return True
-    return any(path.stat().st_mtime >= started_at for path in current_files)
+    return sorted(
+        path
+        for path in current_files
+        if path not in known_files or path.stat().st_mtime >= started_at
+    )
+
+
+def _print_progress(d):
+    """
+    Contrato:
+        Reporta por consola eventos de progreso enviados por `yt-dlp`.
+    Precondiciones:
+        `d` debe ser un diccionario de estado provisto por `yt-dlp`.
+    Postcondiciones:
+        Imprime informacion de descarga o finalizacion cuando el estado aplica,
+        con el uso total del presupuesto de ancho de banda si viene en `d`.
+        No devuelve valor ni altera el estado de descarga.
+    """
+    if d.get("status") == "downloading":
+        eta = d.get("eta")
+        speed = d.get("speed")
+        total = ""
+        if "aggregate_speed" in d:
+            total = (
+                f"(total: {ancho_banda._format_rate(d['aggregate_speed'])} "
+                f"de {ancho_banda._format_rate(d.get('budget'))}, "
+                f"en proceso: {ancho_banda._format_rate(d.get('inprocess_speed'))})"
+            )
+        print(
+            f"[DL] {d.get('filename','')} - {d.get('downloaded_bytes',0)} bytes "
+            f"{'(eta: '+str(eta)+'s)' if eta else ''} "
+            f"{'(speed: '+str(speed)+' B/s)' if speed else ''} {total}"
+        )
+    elif d.get("status") == "finished":
+        print(f"[OK] Descargado: {d.get('filename','')}")
 
 
 def _download_disc(
@@ -322,7 +401,14 @@ def _download_disc(
     rate_limit: Optional[str],
     no_warnings: bool,
     no_playlist: bool,
-) -> Optional[Path]:
+    folder_parts: Optional[tuple[str, str, bool]] = None,
+    on_state: Optional[Callable[..., None]] = None,
+    progress_hook: Optional[Callable[[dict], None]] = _print_progress,
+    quiet: bool = False,
+    cancel: Optional[threading.Event] = None,
+    max_filesize: Optional[int] = None,
+    renditions: Optional[list] = None,
+) -> dict:
     """
     Contrato:
         Descarga una playlist o video en una subcarpeta propia y lo convierte a MP3.
@@ -331,75 +417,137 @@ def _download_disc(
         `base_out` debe existir o poder crearse antes de llamar esta funcion.
         `kbps` debe pertenecer al conjunto de calidades admitidas por la CLI.
         Si se informan `cookies`, `proxy` o `rate_limit`, deben ser validos.
+        Si se informa `folder_parts` (por ejemplo desde un plan), se usa como
+        `(artista, disco, es_playlist)` y se omite la extraccion previa.
+        Si se informa `on_state`, se llama como `on_state(estado, **datos)` al
+        entrar en cada etapa del diario (`resolving`, `downloading`, ...).
+        `progress_hook` recibe los diccionarios de progreso de `yt-dlp`.
+        Con `quiet`, `yt-dlp` no escribe en consola.
+        Si `cancel` se activa, la descarga se interrumpe en el siguiente bloque.
+        `max_filesize` se pasa a `_audio_format_selector`.
+        `renditions` es una lista `(codec, kbps)` de `renditions._parse_renditions`;
+        en ese caso el original se baja una vez a `base_out/.fuente` y cada tema
+        se codifica en todas las versiones con una sola ejecucion de ffmpeg,
+        ignorando `kbps` salvo para elegir el formato (el mayor bitrate pedido).
     Postcondiciones:
-        Devuelve la carpeta de salida si queda al menos un MP3 nuevo o actualizado.
-        Devuelve `None` si falla la extraccion previa, la descarga o no se genera audio.
-        Intenta renombrar miniaturas JPG a `*.cover.jpg` al finalizar.
+        Devuelve un diccionario con `folder` (la carpeta de salida o `None`),
+        `tracks` (los MP3 nuevos o actualizados), `error` (`None` si hubo exito),
+        `bytes_fetched` (bytes descargados) y `bytes_saved` (bytes que no se
+        descargaron respecto de `bestaudio`).
+        Con `renditions`, `folder` es la carpeta de la primera version, `tracks`
+        incluye los temas de todas y `renditions` mapea `codec-kbps -> carpeta`.
+        Falla si la extraccion previa o la descarga fallan o si no se genera audio.
+        Cada MP3 se convierte, etiqueta y recibe su portada con una sola
+        ejecucion de ffmpeg; al finalizar intenta renombrar miniaturas JPG a
+        `*.cover.jpg`.
     """
-    try:
-        info = _probe_info(url, cookies=cookies, proxy=proxy)
-    except Exception as e:
-        print(f"[WARN] No pude extraer metadata de: {url} -> {e}")
-        return None
-
-    artist_name, album_title, is_playlist = _compose_folder_parts(info)
-    folder = base_out / _slugify(artist_name) / _slugify(album_title)
+    on_state = on_state or (lambda state, **extra: None)
+    if folder_parts is None:
+        on_state(journal.RESOLVING)
+        try:
+            info = _probe_info(url, cookies=cookies, proxy=proxy)
+        except Exception as e:
+            return {"folder": None, "tracks": [], "error": f"No pude extraer metadata: {e}"}
+        folder_parts = _compose_folder_parts(info)
+
+    artist_name, album_title, is_playlist = folder_parts
+    album_path = Path(nombres._slugify(artist_name)) / nombres._slugify(album_title)
+    if renditions:
+        folder = base_out / renditions_mod.SOURCE_DIR / album_path
+        kbps = max(rendition_kbps for _, rendition_kbps in renditions)
+    else:
+        folder = base_out / album_path
     folder.mkdir(parents=True, exist_ok=True)
 
     # Elegir plantilla de numeración:
     # - Si es playlist: usamos playlist_index
     # - Si no: usamos autonumber
     if is_playlist:
-        name_tmpl = "%(playlist_index)02d-%(title).200s.%(ext)s"
+        name_tmpl = "%(playlist_index)02d-%(title).200B.%(ext)s"
     else:
-        name_tmpl = "%(autonumber)02d-%(title).200s.%(ext)s"
+        name_tmpl = "%(autonumber)02d-%(title).200B.%(ext)s"
 
     outtmpl = str(folder / name_tmpl)
 
     ydl_opts = _build_common_opts(
-        outtmpl, kbps, cookies, proxy, rate_limit, no_warnings, no_playlist
+        outtmpl, kbps, cookies, proxy, rate_limit, no_warnings, no_playlist, max_filesize, renditions
     )
+    # El titulo se recorta en bytes (`.200B`) para no superar `MAX_NAME_BYTES` con
+    # alfabetos multibyte, y el nombre completo segun lo que queda de ruta.
+    ydl_opts["trim_file_name"] = max(
+        32, min(nombres.MAX_NAME_BYTES - 16, nombres.MAX_PATH_LENGTH - len(str(folder)) - 16)
+    )
+    ydl_opts["progress_hooks"] = [progress_hook] if progress_hook else []
+    if cancel is not None:
 
-    def _progress_hook(d):
-        """
-        Contrato:
-            Reporta por consola eventos de progreso enviados por `yt-dlp`.
-        Precondiciones:
-            `d` debe ser un diccionario de estado provisto por `yt-dlp`.
-        Postcondiciones:
-            Imprime informacion de descarga o finalizacion cuando el estado aplica.
-            No devuelve valor ni altera el estado de descarga.
-        """
-        if d.get("status") == "downloading":
-            eta = d.get("eta")
-            speed = d.get("speed")
-            print(
-                f"[DL] {d.get('filename','')} - {d.get('downloaded_bytes',0)} bytes "
-                f"{'(eta: '+str(eta)+'s)' if eta else ''} "
-                f"{'(speed: '+str(speed)+' B/s)' if speed else ''}"
-            )
-        elif d.get("status") == "finished":
-            print(f"[OK] Descargado: {d.get('filename','')}")
+        def _cancel_hook(d):
+            if cancel.is_set():
+                raise DownloadCancelled("Descarga cancelada")
+
+        ydl_opts["progress_hooks"].insert(0, _cancel_hook)
+
+    counters = {"bytes_fetched": 0, "bytes_saved": 0}
+
+    def _bytes_hook(d):
+        if d.get("status") != "finished":
+            return
+        fetched = d.get("total_bytes") or d.get("downloaded_bytes") or 0
+        counters["bytes_fetched"] += fetched
+        counters["bytes_saved"] += max(0, _bestaudio_bytes(d.get("info_dict") or {}) - fetched)
 
-    ydl_opts["progress_hooks"] = [_progress_hook]
+    ydl_opts["progress_hooks"].append(_bytes_hook)
+    if quiet:
+        ydl_opts["quiet"] = True
+        ydl_opts["noprogress"] = True
 
     try:
         known_mp3_files = {path for path in folder.glob("*.mp3") if path.is_file()}
         started_at = time.time()
+        on_state(journal.DOWNLOADING, folder=str(folder))
         with YoutubeDL(ydl_opts) as ydl:
+            if renditions:
+                encoder = renditions_mod.RenditionsPP(ydl, renditions, base_out, album_path)
+                ydl.add_post_processor(encoder, when="post_process")
+            else:
+                extractor = etiquetas.TaggedExtractAudioPP(
+                    ydl, preferredcodec="mp3", preferredquality=str(kbps)
+                )
+                ydl.add_post_processor(extractor, when="post_process")
             result_code = ydl.download([url])
         if result_code not in (0, None):
-            print(f"[WARN] yt-dlp terminó con código {result_code} para: {url}")
-            return None
+            return {
+                "folder": None,
+                "tracks": [],
+                "error": f"yt-dlp terminó con código {result_code}",
+            }
+        if renditions:
+            on_state(journal.POST_PROCESSING)
+            shutil.rmtree(folder, ignore_errors=True)
+            for parent in (folder.parent, folder.parent.parent):
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+            folders = {name: base_out / name / album_path for name in encoder.outputs}
+            tracks = [track for outputs in encoder.outputs.values() for track in outputs]
+            if not tracks:
+                return {"folder": None, "tracks": [], "error": "No se generó ninguna versión"}
+            return {
+                "folder": next(iter(folders.values())),
+                "tracks": tracks,
+                "error": None,
+                "renditions": folders,
+                **counters,
+            }
+        on_state(journal.POST_PROCESSING)
         # Renombrar thumbnails a cover.jpg (por pista)
         _rename_thumbnails_to_cover(folder)
-        if not _has_recent_mp3_files(folder, started_at, known_mp3_files):
-            print(f"[WARN] No se generó ningún MP3 en: {folder}")
-            return None
-        return folder
+        tracks = _recent_mp3_files(folder, started_at, known_mp3_files)
+        if not tracks:
+            return {"folder": None, "tracks": [], "error": f"No se generó ningún MP3 en: {folder}"}
+        return {"folder": folder, "tracks": tracks, "error": None, **counters}
     except Exception as e:
-        print(f"[ERROR] Falló la descarga de: {url} -> {e}")
-        return None
+        return {"folder": None, "tracks": [], "error": f"Falló la descarga: {e}"}
 
 
 if __name__ == "__main__":
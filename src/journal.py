@@ -0,0 +1,96 @@
+# Diario de ejecucion: registro append-only de estados por URL
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+QUEUED = "queued"
+RESOLVING = "resolving"
+DOWNLOADING = "downloading"
+POST_PROCESSING = "post-processing"
+DONE = "done"
+FAILED = "failed"
+
+STATES = (QUEUED, RESOLVING, DOWNLOADING, POST_PROCESSING, DONE, FAILED)
+
+# Serializa las escrituras de los hilos de un mismo proceso sobre el diario.
+_write_lock = threading.Lock()
+
+
+def _default_path(outdir: Path, shard: Optional[tuple[int, int]] = None) -> Path:
+    """
+    Contrato:
+        Calcula la ruta por defecto del diario dentro del directorio de salida.
+    Precondiciones:
+        `outdir` debe ser el directorio base de la biblioteca.
+        `shard` debe ser `None` o una tupla `(i, N)`.
+    Postcondiciones:
+        Devuelve `journal.jsonl`, o `journal-iofN.jsonl` cuando hay shard, para
+        que varios workers sobre la misma biblioteca no compartan archivo.
+    """
+    if shard is None:
+        return Path(outdir) / "journal.jsonl"
+    return Path(outdir) / f"journal-{shard[0]}of{shard[1]}.jsonl"
+
+
+def _append(journal_path: Optional[Path], url: str, source: str, state: str, **extra):
+    """
+    Contrato:
+        Agrega una transicion de estado al diario y la fuerza a disco.
+    Precondiciones:
+        `state` debe pertenecer a `STATES`.
+        Los valores de `extra` deben ser serializables a JSON.
+    Postcondiciones:
+        Escribe una linea JSON y hace `fsync` antes de volver, de modo que el
+        estado sobrevive a un corte del proceso. Si el diario termina en una
+        linea cortada por un corte anterior, primero la cierra con un salto de
+        linea para que el registro nuevo no quede pegado a ella y se pierda.
+        Si `journal_path` es `None` no hace nada. Los errores de escritura se
+        registran sin interrumpir la descarga.
+    """
+    if journal_path is None:
+        return
+    record = {"ts": time.time(), "url": url, "source": source, "state": state, **extra}
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        with _write_lock, open(journal_path, "ab+") as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+    except OSError as e:
+        logging.error(f"No se pudo escribir el diario {journal_path}: {e}")
+
+
+def _load_states(journal_path: Path, source: str) -> dict:
+    """
+    Contrato:
+        Reconstruye el ultimo estado conocido de cada URL de una fuente.
+    Precondiciones:
+        `journal_path` puede no existir (primera ejecucion).
+    Postcondiciones:
+        Devuelve un diccionario `url -> ultimo registro`.
+        Ignora lineas incompletas, por ejemplo la ultima si el proceso murio
+        mientras escribia.
+    """
+    states = {}
+    try:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("source") == source:
+                    states[record["url"]] = record
+    except FileNotFoundError:
+        pass
+    return states
+
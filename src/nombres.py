@@ -0,0 +1,207 @@
+# Nombres seguros de carpetas y archivos, compartidos por Spotify y YouTube
+
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+# Las expresiones y el conjunto de nombres reservados se construyen una sola vez.
+_INVALID_CHARS_RE = re.compile(r'[\\/:*?"<>|]')
+_SPACES_RE = re.compile(r"\s+")
+_ALBUM_PREFIX_RE = re.compile(r"^Album\s*-\s*", re.IGNORECASE)
+_RESERVED_NAMES = frozenset(
+    {"CON", "PRN", "AUX", "NUL"}
+    | {f"COM{i}" for i in range(1, 10)}
+    | {f"LPT{i}" for i in range(1, 10)}
+)
+
+# Limites de longitud: bytes por componente (ext4, NFS, APFS) y ruta completa.
+MAX_NAME_BYTES = 255
+MAX_PATH_LENGTH = 260 if os.name == "nt" else 4096
+
+# Tamaño de las caches: cubre los artistas, discos y temas de una biblioteca grande.
+_CACHE_SIZE = 1 << 18
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _normalize_unicode(s: str) -> str:
+    """
+    Contrato:
+        Normaliza una cadena y remueve marcas diacriticas combinadas.
+    Precondiciones:
+        `s` debe ser una cadena de texto.
+    Postcondiciones:
+        Devuelve una cadena normalizada en forma NFKD sin diacriticos combinados.
+        No modifica la cadena original.
+    """
+    s = unicodedata.normalize("NFKD", s)
+    # Mantén letras y espacios, quita diacríticos combinados
+    return "".join(c for c in s if not unicodedata.combining(c))
+
+
+def _avoid_reserved(name: str, is_file: bool = False) -> str:
+    """
+    Contrato:
+        Evita nombres reservados de Windows.
+    Postcondiciones:
+        Devuelve `_name` si el nombre es exactamente un nombre reservado (sin
+        su extension, si `is_file`); si no, `name`. La extension se conserva,
+        asi `CON.mp3` pasa a `_CON.mp3`, y `Con. Live` no se toca.
+    """
+    stem = os.path.splitext(name)[0] if is_file else name
+    if stem.strip().upper() in _RESERVED_NAMES:
+        return f"_{name}"
+    return name
+
+
+def _split_suffix(name: str, max_bytes: int = MAX_NAME_BYTES) -> tuple[str, str]:
+    """
+    Separa la extension de un nombre de archivo; un "sufijo" que ocupa la
+    mitad del limite o mas (`Mr. xxxx...`) no es una extension y queda en el nombre.
+    """
+    stem, suffix = os.path.splitext(name)
+    if len(suffix.encode("utf-8")) * 2 >= max_bytes:
+        return name, ""
+    return stem, suffix
+
+
+def _truncate_name(name: str, max_bytes: int = MAX_NAME_BYTES, keep_suffix: bool = True) -> str:
+    """
+    Contrato:
+        Recorta un nombre para que entre en `max_bytes` bytes UTF-8.
+    Precondiciones:
+        `keep_suffix` debe ser falso para carpetas y otros nombres sin
+        extension, donde un punto no separa una extension.
+    Postcondiciones:
+        Devuelve un nombre de como mucho `max_bytes` bytes, sin cortar
+        caracteres multibyte a la mitad. Con `keep_suffix` conserva la
+        extension, salvo que ocupe la mitad del limite o mas.
+    """
+    if len(name.encode("utf-8")) <= max_bytes:
+        return name
+    stem, suffix = _split_suffix(name, max_bytes) if keep_suffix else (name, "")
+    budget = max(1, max_bytes - len(suffix.encode("utf-8")))
+    stem = stem.encode("utf-8")[:budget].decode("utf-8", "ignore").rstrip()
+    return stem + suffix
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _safe_dir_name(name: str, fallback: str = "Desconocido") -> str:
+    """
+    Contrato:
+        Convierte texto de metadata en un nombre seguro para directorio.
+    Precondiciones:
+        `name` puede ser una cadena vacia o valor falsy.
+    Postcondiciones:
+        Devuelve un nombre sin separadores ni caracteres invalidos de rutas,
+        que no es un nombre reservado y entra en `MAX_NAME_BYTES`.
+    """
+    if not name:
+        return fallback
+    name = _INVALID_CHARS_RE.sub(" ", str(name))
+    name = _SPACES_RE.sub(" ", name).strip()
+    return _truncate_name(_avoid_reserved(name), keep_suffix=False) if name else fallback
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _safe_file_name(name: str, fallback: str = "tema.mp3") -> str:
+    """
+    Contrato:
+        Convierte texto de playlist en un nombre seguro para archivo.
+    Precondiciones:
+        `name` puede ser una cadena vacia o valor falsy.
+    Postcondiciones:
+        Devuelve un nombre sin separadores ni caracteres invalidos de rutas,
+        que no es un nombre reservado y entra en `MAX_NAME_BYTES`.
+    """
+    if not name:
+        return fallback
+    name = _INVALID_CHARS_RE.sub("_", str(name))
+    name = _SPACES_RE.sub(" ", name).strip()
+    return _truncate_name(_avoid_reserved(name, is_file=True)) if name else fallback
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _slugify(name: str, maxlen: int = 120) -> str:
+    """
+    Contrato:
+        Convierte un texto en un nombre seguro para carpeta.
+    Precondiciones:
+        `name` debe ser una cadena o un valor falsy aceptable.
+        `maxlen` debe ser un entero positivo.
+    Postcondiciones:
+        Devuelve un nombre sin caracteres conflictivos de rutas.
+        Compacta espacios, limita la longitud a `maxlen` caracteres y a
+        `MAX_NAME_BYTES` bytes, y evita nombres reservados comunes.
+    """
+    if not name:
+        return "Desconocido"
+    name = _normalize_unicode(name)
+    # Remplazo de caracteres problemáticos en rutas
+    name = _INVALID_CHARS_RE.sub(" ", name)
+    # Compactar espacios
+    name = _SPACES_RE.sub(" ", name).strip()
+    if len(name) > maxlen:
+        name = name[:maxlen].rstrip()
+    return _truncate_name(_avoid_reserved(name), keep_suffix=False) or "Desconocido"
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _clean_album_name(name: str) -> str:
+    """
+    Quita el prefijo descriptivo agregado por algunas fuentes de metadata.
+    """
+    return _ALBUM_PREFIX_RE.sub("", str(name)).strip()
+
+
+def _collision_key(name: str) -> str:
+    """
+    Contrato:
+        Calcula la clave con la que dos nombres se pisan en disco.
+    Postcondiciones:
+        Ignora mayusculas y diferencias de normalizacion Unicode, porque
+        sistemas como APFS, NTFS o SMB las tratan como el mismo archivo.
+    """
+    return unicodedata.normalize("NFC", name).casefold()
+
+
+def _unique_name(name: str, taken: set) -> str:
+    """
+    Contrato:
+        Reserva un nombre que no choque con los ya tomados en un directorio.
+    Precondiciones:
+        `taken` debe contener claves de `_collision_key` de los nombres en uso.
+    Postcondiciones:
+        Devuelve `name` si esta libre; si no, `nombre (2).ext`, `nombre (3).ext`...
+        El resultado es determinista para el mismo orden de llamadas.
+        Agrega la clave del nombre devuelto a `taken`.
+    """
+    candidate = name
+    stem, suffix = _split_suffix(name)
+    counter = 2
+    while _collision_key(candidate) in taken:
+        marker = f" ({counter})"
+        budget = MAX_NAME_BYTES - len(marker.encode()) - len(suffix.encode())
+        candidate = _truncate_name(stem, budget, keep_suffix=False)
+        candidate = f"{candidate}{marker}{suffix}"
+        counter += 1
+    taken.add(_collision_key(candidate))
+    return candidate
+
+
+def _fit_file_name(directory: Path, name: str, max_path: int = MAX_PATH_LENGTH) -> str:
+    """
+    Contrato:
+        Recorta un nombre de archivo para que la ruta completa respete `max_path`.
+    Precondiciones:
+        `directory` debe ser la carpeta donde se guardara el archivo.
+    Postcondiciones:
+        Devuelve el nombre (con su extension) que entra en la ruta, o el mismo
+        si ya entraba. El limite se cuenta en caracteres, como en Windows.
+    """
+    budget = max_path - len(str(directory)) - 1
+    if len(name) <= budget:
+        return name
+    stem, suffix = _split_suffix(name)
+    return stem[: max(1, budget - len(suffix))].rstrip() + suffix
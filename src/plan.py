@@ -0,0 +1,128 @@
+# Plan de descargas en dos fases: resolver y descargar
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+PLAN_VERSION = 1
+
+
+def _parse_shard(value: str) -> tuple[int, int]:
+    """
+    Contrato:
+        Interpreta una particion del plan con formato `i/N`.
+    Precondiciones:
+        `value` debe ser una cadena como `1/4`, con `1 <= i <= N`.
+    Postcondiciones:
+        Devuelve la tupla `(i, N)` con el indice basado en 1.
+        Lanza `argparse.ArgumentTypeError` si el formato no es valido.
+    """
+    try:
+        index, total = (int(part) for part in value.split("/", 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard inválido: {value!r} (usá i/N, ej.: 1/4)")
+    if total < 1 or not 1 <= index <= total:
+        raise argparse.ArgumentTypeError(f"Shard fuera de rango: {value!r}")
+    return index, total
+
+
+def _select_shard(entries: List[dict], shard: Optional[tuple[int, int]]) -> List[dict]:
+    """
+    Contrato:
+        Selecciona la porcion del plan que le corresponde a un shard.
+    Precondiciones:
+        `entries` debe ser la lista completa del plan, en el orden del archivo.
+        `shard` debe ser `None` o una tupla `(i, N)` validada por `_parse_shard`.
+    Postcondiciones:
+        Devuelve las entradas cuya posicion `p` cumple `p % N == i - 1`.
+        Los N shards de un mismo plan son disjuntos y cubren todas las entradas.
+        Sin shard devuelve todas las entradas.
+    """
+    if shard is None:
+        return list(entries)
+    index, total = shard
+    return [entry for pos, entry in enumerate(entries) if pos % total == index - 1]
+
+
+def _estimate_track_bytes(duration: Optional[float], kbps: int) -> int:
+    """
+    Contrato:
+        Estima el tamaño final de un tema a partir de su duracion.
+    Precondiciones:
+        `duration` debe estar en segundos o ser `None` si se desconoce.
+        `kbps` debe ser el bitrate de salida esperado.
+    Postcondiciones:
+        Devuelve el tamaño estimado en bytes, o 0 si no hay duracion.
+    """
+    if not duration:
+        return 0
+    return int(duration * kbps * 1000 / 8)
+
+
+def _read_plan(plan_path: Path) -> List[dict]:
+    """
+    Contrato:
+        Lee las entradas de un archivo de plan.
+    Precondiciones:
+        `plan_path` debe apuntar a un plan JSON generado por `_write_plan`.
+    Postcondiciones:
+        Devuelve la lista de entradas en el orden guardado.
+        Lanza `FileNotFoundError` si el archivo no existe y `ValueError` si
+        la version del plan no es compatible.
+    """
+    with open(plan_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != PLAN_VERSION:
+        raise ValueError(f"Versión de plan no soportada: {data.get('version')}")
+    return data.get("entries", [])
+
+
+def _write_plan(plan_path: Path, entries: List[dict], source: str):
+    """
+    Contrato:
+        Guarda las entradas resueltas de una fuente dentro de un archivo de plan.
+    Precondiciones:
+        `entries` deben ser entradas de la fuente `source` (`spotify` o `youtube`).
+        El directorio de `plan_path` debe existir o poder crearse.
+    Postcondiciones:
+        Reemplaza las entradas previas de `source` y conserva las de otras
+        fuentes, de modo que ambos flujos pueden resolver sobre el mismo plan.
+        Escribe en un temporal y lo renombra para no dejar planes a medias.
+    """
+    plan_path = Path(plan_path)
+    try:
+        previous = [entry for entry in _read_plan(plan_path) if entry.get("source") != source]
+    except FileNotFoundError:
+        previous = []
+    plan_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = plan_path.with_name(plan_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": PLAN_VERSION, "entries": previous + entries},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, plan_path)
+
+
+def _load_shard(
+    plan_path: Path, sources: Iterable[str], shard: Optional[tuple[int, int]]
+) -> List[dict]:
+    """
+    Contrato:
+        Obtiene las entradas de las fuentes indicadas que debe ejecutar este shard.
+    Precondiciones:
+        `plan_path` debe apuntar a un plan legible.
+        `sources` debe contener nombres de fuente (`spotify`, `youtube`).
+    Postcondiciones:
+        Particiona el plan completo antes de filtrar por fuente, asi un mismo
+        `--shard i/N` reparte todas las fuentes sin solapamientos entre maquinas.
+    """
+    sources = set(sources)
+    entries = _select_shard(_read_plan(plan_path), shard)
+    return [entry for entry in entries if entry.get("source") in sources]
@@ -4,7 +4,7 @@ import logging
 import argparse
 import sys
 from pathlib import Path
-from src import funcionessp
+from src import ancho_banda, api, funcionessp, funcionesyt, journal, plan
 
 
 # Configuración de logging
@@ -15,16 +15,42 @@ logging.basicConfig(
 DEFAULT_LINKS_FILE = "links.txt"
 
 
-def main():
+def _log_event(event: str, data: dict):
+    """
+    Contrato:
+        Informa por logging los eventos del descargador relevantes para la CLI.
+    Precondiciones:
+        `event` y `data` deben provenir de `api.Downloader`.
+    Postcondiciones:
+        Registra links ignorados, reanudados, fallidos y discos guardados.
+    """
+    url = data["url"]
+    if event == api.IGNORED:
+        logging.info(f"Link ignorado por no ser de Spotify: {url}")
+    elif event == api.RESUMED:
+        logging.info(f"Disco ya descargado en una ejecución previa: {url}")
+    elif event in ("failed", "plan-failed"):
+        logging.error(f"Error al procesar {url}: {data.get('error')}")
+    elif event == "done":
+        logging.info(f"Disco guardado en: {data.get('folder')}")
+    elif event == "planned":
+        logging.info(f"Resuelto: {data.get('artist')} - {data.get('album')}")
+
+
+def main(argv=None):
     """
     Contrato:
         Ejecuta el flujo principal de descargas de Spotify.
     Precondiciones:
+        `argv` (por defecto `sys.argv[1:]`) debe respetar las opciones declaradas.
         Debe existir el archivo de enlaces indicado por CLI, por defecto
         `links.txt` en el mismo directorio que este modulo.
         `funcionessp` debe poder encontrar y ejecutar `spotdl`.
     Postcondiciones:
-        Delega la descarga de las URLs al modulo `funcionessp`.
+        Delega la descarga de las URLs a `api.Downloader` limitado a Spotify.
+        Con `--resolve` solo genera el plan; con `--plan` descarga desde un plan,
+        opcionalmente limitado a un `--shard i/N`.
+        Registra cada etapa en el diario; con `--resume` omite lo ya terminado.
         Sale con codigo 1 si algun link de Spotify falla.
     """
     parser = argparse.ArgumentParser(
@@ -36,11 +62,115 @@ def main():
         default=DEFAULT_LINKS_FILE,
         help="Archivo de texto con las URLs (por defecto: links.txt en el mismo directorio).",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--resolve",
+        metavar="PLAN",
+        default=None,
+        help="Solo resuelve los links y guarda el plan en PLAN, sin descargar.",
+    )
+    parser.add_argument(
+        "--plan",
+        default=None,
+        help="Descarga las entradas de un plan generado con --resolve en lugar de leer links.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=plan._parse_shard,
+        default=None,
+        help="Con --plan, ejecuta solo la porción i de N (ej.: 2/4).",
+    )
+    parser.add_argument(
+        "--journal",
+        default=None,
+        help="Archivo del diario de ejecución (por defecto: journal.jsonl en la carpeta de salida).",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reanuda una ejecución cortada: omite los discos que el diario marca como terminados.",
+    )
+    parser.add_argument(
+        "--spotdl-engine",
+        choices=funcionessp.SPOTDL_ENGINES,
+        default=funcionessp.SUBPROCESS_ENGINE,
+        help="Cómo ejecutar spotdl: un proceso por comando (default) o como librería "
+        "en este proceso, reutilizando sesión y buscador para toda la ejecución.",
+    )
+    parser.add_argument(
+        "--replaygain",
+        action="store_true",
+        help="Calcula ReplayGain de tema y de disco en paralelo y lo escribe en los MP3.",
+    )
+    parser.add_argument(
+        "--staging-dir",
+        default=None,
+        help="Directorio local (disco rápido o tmpfs) donde se arma cada disco antes "
+        "de publicarlo de una vez en la carpeta de salida.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        metavar="K",
+        help="Resuelve en segundo plano la metadata de los K discos siguientes "
+        "mientras se descarga el actual (default 0: desactivado).",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=ancho_banda._parse_rate,
+        default=None,
+        metavar="VELOCIDAD",
+        help="Presupuesto total de ancho de banda del proceso, compartido por todas "
+        "las descargas (ej.: 4M; 0 = sin límite).",
+    )
+    parser.add_argument(
+        "--bandwidth-profile",
+        type=ancho_banda._parse_profiles,
+        default=None,
+        metavar="PERFILES",
+        help="Presupuesto por horario local, que tiene prioridad sobre --bandwidth "
+        "(ej.: 08:00-18:00=2M,18:00-08:00=0).",
+    )
+    args = parser.parse_args(argv)
+    if args.shard and not args.plan:
+        parser.error("--shard requiere --plan")
+    if args.journal:
+        journal_path = Path(args.journal).resolve()
+    else:
+        journal_path = journal._default_path(Path(funcionessp.RAIZ), args.shard)
+    journal_path.parent.mkdir(parents=True, exist_ok=True)
 
+    downloader = api.Downloader(
+        sources=[api.SPOTIFY],
+        journal_path=journal_path,
+        resume=args.resume,
+        verbose=True,
+        spotdl_engine=args.spotdl_engine,
+        replaygain=args.replaygain,
+        staging_dir=args.staging_dir,
+        prefetch=args.prefetch,
+        # Este flujo solo lanza `spotdl`: no hace falta reservar para yt-dlp en proceso
+        bandwidth=ancho_banda._from_args(args.bandwidth, args.bandwidth_profile, reserve=0.0),
+        on_event=_log_event,
+    )
     script_dir = Path(__file__).resolve().parent
     links_path = (script_dir / args.file).resolve()
-    resumen = funcionessp._descargar_discos_desde_archivo(str(links_path))
+    try:
+        if args.plan:
+            results = downloader.download_plan(Path(args.plan).resolve(), args.shard)
+        else:
+            urls = list(funcionesyt._read_urls(links_path))
+            if args.resolve:
+                results = downloader.resolve_to_plan(urls, Path(args.resolve).resolve())
+            else:
+                results = downloader.download_many(urls)
+        resumen = api._summary(results)
+    except FileNotFoundError as e:
+        logging.error(f"No se encontró el archivo: {e}")
+        resumen = {"procesados": 0, "ok": 0, "fallidos": 1, "ignorados": 0}
+    except Exception as e:
+        logging.error(f"Error al procesar el archivo: {e}")
+        resumen = {"procesados": 0, "ok": 0, "fallidos": 1, "ignorados": 0}
     print(
         "[RESUMEN] Spotify - "
         f"procesados: {resumen['procesados']}, "
@@ -18,19 +18,55 @@ Uso:
 import argparse
 import sys
 from pathlib import Path
-from src import funcionesyt
+from src import ancho_banda, api, funcionesyt, journal, plan, renditions
 
 DEFAULT_LINKS_FILE = "links.txt"
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_OUTDIR = PROJECT_ROOT / "salida"
 
 
-def main():
+def _megabytes(size: int) -> str:
+    """
+    Formatea una cantidad de bytes en MB para la consola.
+    """
+    return f"{size / 1_000_000:.1f} MB"
+
+
+def _print_event(event: str, data: dict):
+    """
+    Contrato:
+        Informa por consola los eventos del descargador relevantes para la CLI.
+    Precondiciones:
+        `event` y `data` deben provenir de `api.Downloader`.
+    Postcondiciones:
+        Imprime el avance por disco con el mismo formato de siempre.
+    """
+    url = data["url"]
+    if event == "started":
+        print(f"\n[INFO] ({data['index']}/{data['total']}) Descargando disco: {url}")
+    elif event == "done":
+        print(f"[OK] Guardado en: {data['folder']}")
+        print(
+            f"[INFO] Descargados {_megabytes(data.get('bytes_fetched', 0))}, "
+            f"ahorrados {_megabytes(data.get('bytes_saved', 0))} frente a bestaudio"
+        )
+    elif event == "failed":
+        print(f"[WARN] {data.get('error')}")
+        print("[WARN] Este disco no se pudo descargar.")
+    elif event == api.RESUMED:
+        print(f"[INFO] Ya descargado en una ejecución previa: {url}")
+    elif event == "planning":
+        print(f"[INFO] Resolviendo: {url}")
+    elif event == "plan-failed":
+        print(f"[WARN] No pude resolver: {url} -> {data.get('error')}")
+
+
+def main(argv=None):
     """
     Contrato:
         Ejecuta el flujo principal de descargas desde YouTube/YouTube Music.
     Precondiciones:
-        Los argumentos de CLI deben respetar las opciones declaradas.
+        `argv` (por defecto `sys.argv[1:]`) debe respetar las opciones declaradas.
         El archivo de enlaces debe existir y contener cero o mas URLs validas.
         `yt-dlp` y `ffmpeg` deben estar disponibles para descargar y convertir.
     Postcondiciones:
@@ -57,6 +93,19 @@ def main():
         choices=[64, 96, 128, 160, 192, 224, 256, 320],
         help="Bitrate MP3 en kbps (default 128).",
     )
+    parser.add_argument(
+        "--renditions",
+        type=renditions._parse_renditions,
+        default=None,
+        help="Versiones a generar desde una sola descarga, cada una en su carpeta "
+        "(ej.: mp3:320,mp3:128,opus:96). Reemplaza a --kbps.",
+    )
+    parser.add_argument(
+        "--max-filesize",
+        type=funcionesyt._parse_size,
+        default=None,
+        help="Tamaño máximo preferido por tema al elegir el formato de origen (ej.: 10M).",
+    )
     parser.add_argument(
         "--cookies",
         default=None,
@@ -84,60 +133,154 @@ def main():
         action="store_true",
         help="Si se pasa, no descargará la playlist completa cuando la URL apunte a una.",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--resolve",
+        metavar="PLAN",
+        default=None,
+        help="Solo resuelve los links y guarda el plan en PLAN, sin descargar.",
+    )
+    parser.add_argument(
+        "--plan",
+        default=None,
+        help="Descarga las entradas de un plan generado con --resolve en lugar de leer links.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=plan._parse_shard,
+        default=None,
+        help="Con --plan, ejecuta solo la porción i de N (ej.: 2/4).",
+    )
+    parser.add_argument(
+        "--journal",
+        default=None,
+        help="Archivo del diario de ejecución (por defecto: journal.jsonl en la carpeta de salida).",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reanuda una ejecución cortada: omite los discos que el diario marca como terminados.",
+    )
+    parser.add_argument(
+        "--replaygain",
+        action="store_true",
+        help="Calcula ReplayGain de tema y de disco en paralelo y lo escribe en los MP3.",
+    )
+    parser.add_argument(
+        "--staging-dir",
+        default=None,
+        help="Directorio local (disco rápido o tmpfs) donde se arma cada disco antes "
+        "de publicarlo de una vez en la carpeta de salida.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        metavar="K",
+        help="Resuelve en segundo plano la metadata de los K discos siguientes "
+        "mientras se descarga el actual (default 0: desactivado).",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=ancho_banda._parse_rate,
+        default=None,
+        metavar="VELOCIDAD",
+        help="Presupuesto total de ancho de banda del proceso, compartido por todas "
+        "las descargas (ej.: 4M; 0 = sin límite).",
+    )
+    parser.add_argument(
+        "--bandwidth-profile",
+        type=ancho_banda._parse_profiles,
+        default=None,
+        metavar="PERFILES",
+        help="Presupuesto por horario local, que tiene prioridad sobre --bandwidth "
+        "(ej.: 08:00-18:00=2M,18:00-08:00=0).",
+    )
+    args = parser.parse_args(argv)
+    if args.shard and not args.plan:
+        parser.error("--shard requiere --plan")
 
     script_dir = Path(__file__).resolve().parent
     links_path = (script_dir / args.file).resolve()
     base_out = Path(args.outdir).resolve()
     base_out.mkdir(parents=True, exist_ok=True)
+    if args.journal:
+        journal_path = Path(args.journal).resolve()
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        journal_path = journal._default_path(base_out, args.shard)
 
-    all_urls = list(funcionesyt._read_urls(links_path))
-    urls = [url for url in all_urls if funcionesyt._is_youtube_url(url)]
-    ignorados = len(all_urls) - len(urls)
-    if not urls:
-        print(f"[INFO] No hay URLs de YouTube en {links_path}")
-        print(
-            "[RESUMEN] YouTube - "
-            f"procesados: 0, ok: 0, fallidos: 0, ignorados: {ignorados}"
-        )
-        return
+    if args.plan:
+        origin = Path(args.plan).resolve()
+        urls = None
+    else:
+        origin = links_path
+        urls = list(funcionesyt._read_urls(links_path))
+        if not any(funcionesyt._is_youtube_url(url) for url in urls):
+            print(f"[INFO] No hay URLs de YouTube en {links_path}")
+            print(
+                "[RESUMEN] YouTube - "
+                f"procesados: 0, ok: 0, fallidos: 0, ignorados: {len(urls)}"
+            )
+            return
 
     if not funcionesyt._check_dependencies():
+        total = len(urls) if urls is not None else 0
         print(
             "[RESUMEN] YouTube - "
-            f"procesados: {len(urls)}, ok: 0, fallidos: {len(urls)}, ignorados: {ignorados}"
+            f"procesados: {total}, ok: 0, fallidos: {total}, ignorados: 0"
         )
         sys.exit(1)
 
-    print(f"[INFO] Voy a procesar {len(urls)} URL(s) de YouTube desde {links_path}")
-    ok = 0
-    fallidos = 0
-    for i, url in enumerate(urls, 1):
-        print(f"\n[INFO] ({i}/{len(urls)}) Descargando disco: {url}")
-        folder = funcionesyt._download_disc(
-            url=url,
-            base_out=base_out,
-            kbps=args.kbps,
-            cookies=args.cookies,
-            proxy=args.proxy,
-            rate_limit=args.rate_limit,
-            no_warnings=args.no_warnings,
-            no_playlist=args.no_playlist,
-        )
-        if folder:
-            ok += 1
-            print(f"[OK] Guardado en: {folder}")
-        else:
-            fallidos += 1
-            print("[WARN] Este disco no se pudo descargar.")
+    downloader = api.Downloader(
+        outdir=base_out,
+        kbps=args.kbps,
+        cookies=args.cookies,
+        proxy=args.proxy,
+        rate_limit=args.rate_limit,
+        no_warnings=args.no_warnings,
+        no_playlist=args.no_playlist,
+        sources=[api.YOUTUBE],
+        journal_path=journal_path,
+        resume=args.resume,
+        verbose=True,
+        replaygain=args.replaygain,
+        staging_dir=args.staging_dir,
+        max_filesize=args.max_filesize,
+        renditions=args.renditions,
+        prefetch=args.prefetch,
+        bandwidth=ancho_banda._from_args(args.bandwidth, args.bandwidth_profile),
+        on_event=_print_event,
+    )
+    if args.plan:
+        print(f"[INFO] Voy a procesar el plan {origin}")
+        try:
+            results = downloader.download_plan(origin, args.shard)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"[ERROR] No pude leer el plan {origin}: {e}")
+            sys.exit(1)
+    elif args.resolve:
+        print(f"[INFO] Voy a resolver las URLs de YouTube desde {origin}")
+        plan_path = Path(args.resolve).resolve()
+        results = downloader.resolve_to_plan(urls, plan_path)
+        print(f"[OK] Plan guardado en: {plan_path}")
+    else:
+        print(f"[INFO] Voy a procesar las URLs de YouTube desde {origin}")
+        results = downloader.download_many(urls)
+    resumen = api._summary(results)
     print(
         "[RESUMEN] YouTube - "
-        f"procesados: {len(urls)}, "
-        f"ok: {ok}, "
-        f"fallidos: {fallidos}, "
-        f"ignorados: {ignorados}"
+        f"procesados: {resumen['procesados']}, "
+        f"ok: {resumen['ok']}, "
+        f"fallidos: {resumen['fallidos']}, "
+        f"ignorados: {resumen['ignorados']}"
     )
-    if fallidos:
+    if resumen["bytes_descargados"]:
+        print(
+            "[RESUMEN] YouTube - "
+            f"descargados: {_megabytes(resumen['bytes_descargados'])}, "
+            f"ahorrados frente a bestaudio: {_megabytes(resumen['bytes_ahorrados'])}"
+        )
+    if resumen["fallidos"]:
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+# Varias versiones (codec y bitrate) de un mismo tema con una sola pasada de ffmpeg
+
+import argparse
+import base64
+import logging
+import shutil
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+from mutagen import File as MutagenFile
+from mutagen.flac import Picture
+from yt_dlp.postprocessor.common import PostProcessor
+from yt_dlp.utils import PostProcessingError
+
+from src import etiquetas
+
+# Codec de la CLI -> (encoder de ffmpeg, extension, ffmpeg embebe la portada).
+CODECS = {
+    "mp3": ("libmp3lame", "mp3", True),
+    "aac": ("aac", "m4a", True),
+    "opus": ("libopus", "opus", False),
+    "vorbis": ("libvorbis", "ogg", False),
+}
+
+# Carpeta donde queda el audio original hasta que se codifican las versiones.
+SOURCE_DIR = ".fuente"
+
+
+def _parse_renditions(value: str) -> List[tuple[str, int]]:
+    """
+    Contrato:
+        Interpreta la opcion `--renditions` (ej.: `mp3:320,mp3:128,opus:96`).
+    Postcondiciones:
+        Devuelve una lista de `(codec, kbps)` sin repetidos y en el orden dado;
+        la primera es la version principal. Lanza `argparse.ArgumentTypeError`
+        si algun codec no esta en `CODECS` o el bitrate no es valido.
+    """
+    renditions = []
+    for item in value.split(","):
+        codec, _, kbps = item.strip().lower().partition(":")
+        if codec not in CODECS or not kbps.isdigit() or not 8 <= int(kbps) <= 512:
+            raise argparse.ArgumentTypeError(
+                f"version invalida: {item!r} (formato codec:kbps, codecs: {', '.join(CODECS)})"
+            )
+        if (codec, int(kbps)) not in renditions:
+            renditions.append((codec, int(kbps)))
+    if not renditions:
+        raise argparse.ArgumentTypeError("se necesita al menos una version")
+    return renditions
+
+
+def _rendition_name(codec: str, kbps: int) -> str:
+    """
+    Nombre de la carpeta raiz de una version, por ejemplo `mp3-320`.
+    """
+    return f"{codec}-{kbps}"
+
+
+def _encode_command(
+    source: Path, cover: Optional[Path], targets: List[tuple[str, int, Path]], metadata: List[str]
+) -> List[str]:
+    """
+    Contrato:
+        Construye un unico comando ffmpeg que codifica todas las versiones.
+    Precondiciones:
+        `targets` contiene `(codec, kbps, archivo_destino)`.
+    Postcondiciones:
+        El audio de `source` se lee y decodifica una sola vez y alimenta un
+        encoder por salida. La portada se embebe en los contenedores que lo
+        admiten (MP3, M4A). Los MP3 quedan con `etiquetas.ID3_PADDING` bytes
+        libres en la cabecera para las etiquetas ReplayGain.
+    """
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(source)]
+    if cover is not None:
+        command += ["-i", str(cover)]
+    for codec, kbps, target in targets:
+        encoder, _, embeds_cover = CODECS[codec]
+        command += ["-map", "0:a:0"]
+        if cover is not None and embeds_cover:
+            command += etiquetas._cover_args(1)
+        command += ["-c:a", encoder, "-b:a", f"{kbps}k", "-map_metadata", "-1", *metadata]
+        if codec == "mp3":
+            command += ["-id3v2_version", "3", "-metadata_header_padding", str(etiquetas.ID3_PADDING)]
+        command.append(str(target))
+    return command
+
+
+def _embed_ogg_cover(path: Path, cover: Path):
+    """
+    Contrato:
+        Embebe una portada en un archivo Ogg (Opus o Vorbis).
+    Precondiciones:
+        `cover` debe ser un JPG.
+    Postcondiciones:
+        Agrega el bloque `METADATA_BLOCK_PICTURE`, que ffmpeg no escribe en Ogg.
+    """
+    picture = Picture()
+    picture.type = 3
+    picture.mime = "image/jpeg"
+    picture.data = cover.read_bytes()
+    audio = MutagenFile(path)
+    audio["metadata_block_picture"] = [base64.b64encode(picture.write()).decode("ascii")]
+    audio.save()
+
+
+class RenditionsPP(PostProcessor):
+    """
+    Postprocesador de `yt-dlp` que codifica cada tema descargado en todas las
+    versiones pedidas y deja cada una en su propio arbol de carpetas:
+    `base_out/<codec-kbps>/<artista>/<disco>/<tema>.<ext>`, con su portada.
+    """
+
+    def __init__(self, downloader, renditions: List[tuple[str, int]], base_out: Path, album_path: Path):
+        super().__init__(downloader)
+        self.renditions = renditions
+        self.base_out = Path(base_out)
+        self.album_path = Path(album_path)
+        self.outputs = {_rendition_name(codec, kbps): [] for codec, kbps in renditions}
+
+    def _folder(self, codec: str, kbps: int) -> Path:
+        return self.base_out / _rendition_name(codec, kbps) / self.album_path
+
+    def run(self, info):
+        source = Path(info["filepath"])
+        cover = etiquetas._thumbnail_path(info)
+        targets = []
+        for codec, kbps in self.renditions:
+            folder = self._folder(codec, kbps)
+            folder.mkdir(parents=True, exist_ok=True)
+            targets.append((codec, kbps, folder / f"{source.stem}.{CODECS[codec][1]}"))
+        self.to_screen(f"Codificando {len(targets)} versiones de {source.name}")
+        process = subprocess.run(
+            _encode_command(source, cover, targets, etiquetas._metadata_args(info)),
+            capture_output=True,
+            text=True,
+            errors="replace",
+        )
+        if process.returncode != 0:
+            raise PostProcessingError(f"ffmpeg no pudo codificar las versiones: {process.stderr.strip()}")
+        for codec, kbps, target in targets:
+            if cover is not None:
+                shutil.copyfile(cover, target.with_name(f"{target.stem}.cover.jpg"))
+                if not CODECS[codec][2]:
+                    try:
+                        _embed_ogg_cover(target, cover)
+                    except Exception as e:
+                        logging.warning(f"No se pudo embeber la portada en {target}: {e}")
+            self.outputs[_rendition_name(codec, kbps)].append(target)
+        # El original y su miniatura ya no hacen falta
+        to_delete = [str(source)] + ([str(cover)] if cover is not None else [])
+        return to_delete, info
@@ -0,0 +1,171 @@
+# Analisis de sonoridad y etiquetas ReplayGain para discos descargados
+
+import logging
+import math
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from mutagen.id3 import ID3, ID3NoHeaderError, TXXX
+
+# Nivel de referencia de ReplayGain 2.0 en LUFS.
+REFERENCE_LUFS = -18.0
+
+_INTEGRATED_RE = re.compile(r"^\s*I:\s+(-?[\d.]+|-inf) LUFS", re.MULTILINE)
+_PEAK_RE = re.compile(r"^\s*Peak:\s+(-?[\d.]+|-inf) dBFS", re.MULTILINE)
+_DURATION_RE = re.compile(r"Duration:\s+(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def _analyze_track(path: Path) -> dict:
+    """
+    Contrato:
+        Mide la sonoridad integrada y el pico real de un archivo de audio.
+    Precondiciones:
+        `path` debe ser un archivo de audio legible por `ffmpeg`.
+        `ffmpeg` debe estar en PATH.
+    Postcondiciones:
+        Devuelve `path`, `loudness` (LUFS), `peak` (lineal) y `duration` (segundos).
+        Lanza `RuntimeError` si `ffmpeg` falla o no informa el resumen.
+    """
+    command = [
+        "ffmpeg", "-hide_banner", "-nostats", "-i", str(path),
+        "-map", "0:a:0", "-af", "ebur128=peak=true:framelog=verbose",
+        "-f", "null", "-",
+    ]
+    process = subprocess.run(command, capture_output=True, text=True, errors="replace")
+    loudness = _INTEGRATED_RE.findall(process.stderr)
+    peak = _PEAK_RE.findall(process.stderr)
+    if process.returncode != 0 or not loudness or not peak:
+        raise RuntimeError(f"ffmpeg no pudo analizar {path}")
+    duration = _DURATION_RE.search(process.stderr)
+    seconds = 0.0
+    if duration:
+        hours, minutes, secs = duration.groups()
+        seconds = int(hours) * 3600 + int(minutes) * 60 + float(secs)
+    return {
+        "path": path,
+        "loudness": float(loudness[-1]),
+        "peak": 10 ** (float(peak[-1]) / 20),
+        "duration": seconds,
+    }
+
+
+def _album_loudness(analyses: List[dict]) -> float:
+    """
+    Contrato:
+        Combina la sonoridad de varios temas en la sonoridad del disco.
+    Precondiciones:
+        `analyses` debe contener resultados de `_analyze_track`.
+    Postcondiciones:
+        Devuelve el promedio de energia ponderado por duracion, equivalente a
+        medir el disco como un unico archivo continuo.
+    """
+    weights = [analysis["duration"] or 1.0 for analysis in analyses]
+    energy = sum(
+        weight * 10 ** (analysis["loudness"] / 10)
+        for weight, analysis in zip(weights, analyses)
+        if not math.isinf(analysis["loudness"])
+    )
+    if energy <= 0:
+        return REFERENCE_LUFS
+    return 10 * math.log10(energy / sum(weights))
+
+
+def _write_tags(path: Path, tags: dict):
+    """
+    Contrato:
+        Escribe frames TXXX de ReplayGain en un MP3 sin recodificar el audio.
+    Precondiciones:
+        `path` debe ser un MP3 escribible.
+    Postcondiciones:
+        Reemplaza las etiquetas ReplayGain previas con una sola escritura y
+        conserva ID3v2.3, la version que escribe `etiquetas.TaggedExtractAudioPP`.
+    """
+    try:
+        id3 = ID3(path)
+    except ID3NoHeaderError:
+        id3 = ID3()
+    for key, value in tags.items():
+        id3.delall(f"TXXX:{key}")
+        id3.add(TXXX(encoding=3, desc=key, text=[value]))
+    id3.save(path, v2_version=3)
+
+
+def _replaygain_tags(track: dict, album_gain: float, album_peak: float) -> dict:
+    """
+    Contrato:
+        Construye las etiquetas ReplayGain de un tema.
+    Precondiciones:
+        `track` debe ser un resultado de `_analyze_track`.
+    Postcondiciones:
+        Devuelve las cuatro etiquetas con el formato estandar (`-6.20 dB`, `0.988553`).
+    """
+    # Un tema en silencio total mide -inf LUFS: se deja sin ajuste
+    track_gain = 0.0 if math.isinf(track["loudness"]) else REFERENCE_LUFS - track["loudness"]
+    return {
+        "REPLAYGAIN_TRACK_GAIN": f"{track_gain:.2f} dB",
+        "REPLAYGAIN_TRACK_PEAK": f"{track['peak']:.6f}",
+        "REPLAYGAIN_ALBUM_GAIN": f"{album_gain:.2f} dB",
+        "REPLAYGAIN_ALBUM_PEAK": f"{album_peak:.6f}",
+    }
+
+
+def _analyze_album(tracks: List[Path], workers: Optional[int] = None) -> Optional[dict]:
+    """
+    Contrato:
+        Analiza en paralelo todos los temas de un disco.
+    Precondiciones:
+        `tracks` deben ser archivos de audio del mismo disco.
+        `workers` limita los `ffmpeg` simultaneos (por defecto, uno por CPU).
+    Postcondiciones:
+        Devuelve `{"tracks": [...], "album_gain": dB, "album_peak": lineal}` o
+        `None` si ningun tema pudo analizarse. Los temas que fallan se registran
+        y quedan fuera del calculo del disco.
+    """
+    if not tracks:
+        return None
+    workers = workers or os.cpu_count() or 1
+    analyses = []
+    # Cada analisis corre en su propio proceso `ffmpeg`; los hilos solo esperan,
+    # asi un disco tarda aproximadamente lo que su tema mas largo.
+    with ThreadPoolExecutor(max_workers=min(workers, len(tracks))) as executor:
+        for path, future in [(path, executor.submit(_analyze_track, path)) for path in tracks]:
+            try:
+                analyses.append(future.result())
+            except Exception as e:
+                logging.warning(f"No se pudo analizar la sonoridad de {path}: {e}")
+    if not analyses:
+        return None
+    return {
+        "tracks": analyses,
+        "album_gain": REFERENCE_LUFS - _album_loudness(analyses),
+        "album_peak": max(analysis["peak"] for analysis in analyses),
+    }
+
+
+def _tag_album(tracks: List[Path], workers: Optional[int] = None) -> int:
+    """
+    Contrato:
+        Calcula y escribe ReplayGain de tema y de disco para un disco descargado.
+    Precondiciones:
+        Las mismas que `_analyze_album`; los archivos deben ser MP3 escribibles.
+    Postcondiciones:
+        Escribe las etiquetas en el lugar y devuelve cuantos temas se etiquetaron.
+    """
+    result = _analyze_album(tracks, workers)
+    if result is None:
+        return 0
+    tagged = 0
+    for track in result["tracks"]:
+        try:
+            _write_tags(
+                track["path"],
+                _replaygain_tags(track, result["album_gain"], result["album_peak"]),
+            )
+            tagged += 1
+        except Exception as e:
+            logging.warning(f"No se pudo escribir ReplayGain en {track['path']}: {e}")
+    return tagged
@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+Servidor local de trabajos de descarga:
+- Escucha en localhost por HTTP (o en un socket Unix) y acepta trabajos en JSON
+- Ordena los trabajos en una cola de prioridad: temas sueltos antes que playlists
+- Permite consultar y cancelar trabajos, incluso mientras se descargan
+- Mantiene un unico proceso caliente: yt-dlp, el diario y los limites se comparten
+
+Uso:
+    python main.py --serve
+    python main.py --serve --port 8765 --workers 2
+    python main.py --serve --socket /tmp/descargas.sock
+
+API:
+    POST   /jobs        {"url": "...", "priority": 0}  -> crea un trabajo
+    GET    /jobs                                      -> lista los trabajos
+    GET    /jobs/<id>                                 -> estado de un trabajo
+    DELETE /jobs/<id>                                 -> cancela un trabajo
+    GET    /bandwidth                                 -> presupuesto y uso actual
+    PUT    /bandwidth   {"rate": "2M", "profile": "..."} -> cambia el presupuesto en caliente
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from src import ancho_banda, api, funcionessp, funcionesyt, journal, renditions
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+QUEUED = journal.QUEUED
+RUNNING = "running"
+
+# Trabajos terminados que se conservan para consultar su resultado.
+KEEP_FINISHED = 200
+FINISHED_TTL = 3600.0
+
+
+def _estimate_priority(url: str) -> int:
+    """
+    Contrato:
+        Estima la prioridad de una URL a partir de su forma, sin consultar metadata.
+    Precondiciones:
+        `url` debe ser una cadena ya normalizada con `strip`.
+    Postcondiciones:
+        Devuelve 0 para temas sueltos, 1 para albums y 2 para playlists o
+        artistas, de modo que los trabajos chicos salen primero y baja el
+        tiempo medio de finalizacion.
+    """
+    source = api._source_of(url)
+    if source == api.SPOTIFY:
+        kind = funcionessp._canonical_url(url).split("/")[3:4]
+        return {"track": 0, "album": 1}.get(kind[0] if kind else "", 2)
+    query = parse_qs(urlparse(url).query)
+    if "list" in query or "/playlist" in url:
+        return 2
+    return 0
+
+
+class Job:
+    """
+    Trabajo de descarga encolado en el servidor.
+    """
+
+    def __init__(self, job_id: int, url: str, priority: int):
+        self.id = job_id
+        self.url = url
+        self.priority = priority
+        self.status = QUEUED
+        self.stage: Optional[str] = None
+        self.progress: dict = {}
+        self.result: Optional[api.UrlResult] = None
+        self.cancel = threading.Event()
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        """
+        Contrato:
+            Serializa el trabajo para las respuestas JSON.
+        Postcondiciones:
+            Devuelve un diccionario con estado, etapa, progreso y resultado.
+        """
+        data = {
+            "id": self.id,
+            "url": self.url,
+            "priority": self.priority,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.result is not None:
+            data["folder"] = str(self.result.folder) if self.result.folder else None
+            data["tracks"] = [
+                {"path": str(track.path), "size": track.size} for track in self.result.tracks
+            ]
+            data["error"] = self.result.error
+            data["bytes_fetched"] = self.result.bytes_fetched
+            data["bytes_saved"] = self.result.bytes_saved
+            data["renditions"] = {
+                name: str(path) for name, path in self.result.renditions.items()
+            }
+        return data
+
+
+class JobServer:
+    """
+    Cola de prioridad de trabajos atendida por hilos que comparten un `api.Downloader`.
+    """
+
+    def __init__(
+        self,
+        downloader_options: dict,
+        workers: int = 1,
+        keep_finished: int = KEEP_FINISHED,
+        finished_ttl: float = FINISHED_TTL,
+    ):
+        self.downloader = api.Downloader(
+            **downloader_options,
+            on_event=self._on_event,
+            on_progress=self._on_progress,
+        )
+        self.workers = workers
+        self.keep_finished = keep_finished
+        self.finished_ttl = finished_ttl
+        self._heap: List[tuple] = []
+        self._jobs: dict = {}
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def submit(self, url: str, priority: Optional[int] = None) -> Job:
+        """
+        Contrato:
+            Encola una URL para su descarga.
+        Precondiciones:
+            `url` debe ser de Spotify o YouTube.
+            `priority`, si se informa, reemplaza la estimada; menor sale antes.
+        Postcondiciones:
+            Devuelve el trabajo creado. Lanza `TypeError` si `url` no es una
+            cadena y `ValueError` si la URL no es soportada.
+        """
+        if not isinstance(url, str):
+            raise TypeError("`url` debe ser una cadena")
+        url = url.strip()
+        if api._source_of(url) not in self.downloader.sources:
+            raise ValueError(f"URL no soportada: {url}")
+        if priority is None:
+            priority = _estimate_priority(url)
+        with self._cond:
+            job = Job(next(self._ids), url, int(priority))
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (job.priority, job.id, job))
+            self._cond.notify()
+        logging.info(f"Trabajo {job.id} encolado (prioridad {job.priority}): {url}")
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._cond:
+            self._prune_finished()
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        with self._cond:
+            self._prune_finished()
+            return list(self._jobs.values())
+
+    def _prune_finished(self):
+        """
+        Contrato:
+            Olvida los trabajos terminados viejos para que la memoria no crezca.
+        Precondiciones:
+            Debe llamarse con `_cond` tomado.
+        Postcondiciones:
+            Quita los terminados hace mas de `finished_ttl` segundos y, de los
+            restantes, conserva solo los `keep_finished` mas recientes. Los
+            trabajos encolados o en curso no se tocan.
+        """
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at,
+        )
+        expired = time.time() - self.finished_ttl
+        excess = len(finished) - self.keep_finished
+        for index, job in enumerate(finished):
+            if index < excess or job.finished_at < expired:
+                del self._jobs[job.id]
+
+    def cancel(self, job_id: int) -> Optional[Job]:
+        """
+        Contrato:
+            Cancela un trabajo encolado o en curso.
+        Postcondiciones:
+            Un trabajo encolado pasa a `cancelled` sin ejecutarse; uno en curso
+            se interrumpe en el siguiente bloque descargado. Los trabajos ya
+            terminados no cambian. Devuelve el trabajo o `None` si no existe.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == QUEUED:
+                job.status = api.CANCELLED
+                job.finished_at = time.time()
+            job.cancel.set()
+            return job
+
+    def start(self):
+        """
+        Contrato:
+            Arranca los hilos que atienden la cola.
+        Postcondiciones:
+            Quedan `workers` hilos demonio esperando trabajos.
+        """
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"descargas-{index + 1}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Contrato:
+            Detiene los hilos y cancela los trabajos en curso.
+        Postcondiciones:
+            Los trabajos encolados quedan sin ejecutar.
+        """
+        with self._cond:
+            self._stopping = True
+            for job in self._jobs.values():
+                if job.status == RUNNING:
+                    job.cancel.set()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _next_job(self) -> Optional[Job]:
+        with self._cond:
+            while not self._stopping:
+                while self._heap:
+                    _, _, job = heapq.heappop(self._heap)
+                    if job.status == QUEUED:
+                        job.status = RUNNING
+                        job.started_at = time.time()
+                        return job
+                self._cond.wait()
+            return None
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            self._local.job = job
+            try:
+                result = self.downloader.download(job.url, cancel=job.cancel)
+            except Exception as e:
+                logging.error(f"Error inesperado en el trabajo {job.id}: {e}")
+                result = api.UrlResult(
+                    job.url, api._source_of(job.url), journal.FAILED, error=str(e)
+                )
+            finally:
+                self._local.job = None
+            with self._cond:
+                job.result = result
+                job.status = result.status
+                job.finished_at = time.time()
+                self._prune_finished()
+            logging.info(f"Trabajo {job.id} terminado: {job.status}")
+
+    def bandwidth_status(self) -> dict:
+        """
+        Contrato:
+            Informa el presupuesto de ancho de banda y su uso.
+        Postcondiciones:
+            Devuelve la configuracion (`rate`, `profiles`) y el uso de
+            `BandwidthScheduler._status`.
+        """
+        bandwidth = self.downloader.bandwidth
+        return {**bandwidth._settings(), **bandwidth._status()}
+
+    def set_bandwidth(self, payload: dict) -> dict:
+        """
+        Contrato:
+            Cambia el presupuesto de ancho de banda sin reiniciar el servidor.
+        Precondiciones:
+            `payload` puede traer `rate` (`"2M"`, `0` o `null` para sin limite)
+            y `profile` (`"08:00-18:00=2M"`, `""` para quitar los perfiles).
+        Postcondiciones:
+            Las descargas en curso toman el cambio en su siguiente bloque;
+            las de `spotdl` ya lanzadas conservan su porcion hasta terminar.
+            Lanza `argparse.ArgumentTypeError` si algun valor no es valido.
+        """
+        bandwidth = self.downloader.bandwidth
+        if "rate" in payload:
+            rate = payload["rate"]
+            bandwidth.set_rate(None if rate is None else ancho_banda._parse_rate(str(rate)))
+        if "profile" in payload:
+            bandwidth.set_profiles(ancho_banda._parse_profiles(payload["profile"] or ""))
+        logging.info(f"Presupuesto de ancho de banda actualizado: {bandwidth._settings()}")
+        return self.bandwidth_status()
+
+    def _on_event(self, event: str, data: dict):
+        job = getattr(self._local, "job", None)
+        if job is not None:
+            job.stage = event
+
+    def _on_progress(self, data: dict):
+        job = getattr(self._local, "job", None)
+        if job is not None:
+            job.progress = {
+                key: data.get(key)
+                for key in (
+                    "filename",
+                    "downloaded_bytes",
+                    "total_bytes",
+                    "speed",
+                    "eta",
+                    "aggregate_speed",
+                    "inprocess_speed",
+                    "budget",
+                )
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Expone la cola de trabajos como una API JSON minima.
+    """
+
+    server_version = "pyspotify-servidor"
+
+    @property
+    def jobs(self) -> JobServer:
+        return self.server.jobs
+
+    def address_string(self) -> str:
+        # Con socket Unix `client_address` viene vacio
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_id(self) -> Optional[int]:
+        parts = [part for part in urlparse(self.path).path.split("/") if part]
+        if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            return int(parts[1])
+        return None
+
+    def _is_collection(self) -> bool:
+        return urlparse(self.path).path.rstrip("/") == "/jobs"
+
+    def _is_bandwidth(self) -> bool:
+        return urlparse(self.path).path.rstrip("/") == "/bandwidth"
+
+    def do_GET(self):
+        if self._is_bandwidth():
+            self._send(200, self.jobs.bandwidth_status())
+            return
+        if self._is_collection():
+            self._send(200, [job.to_dict() for job in self.jobs.list_jobs()])
+            return
+        job_id = self._job_id()
+        job = self.jobs.get(job_id) if job_id is not None else None
+        if job is None:
+            self._send(404, {"error": "Trabajo inexistente"})
+            return
+        self._send(200, job.to_dict())
+
+    def do_POST(self):
+        if not self._is_collection():
+            self._send(404, {"error": "Ruta inexistente"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            job = self.jobs.submit(payload["url"], payload.get("priority"))
+        except (KeyError, TypeError, ValueError) as e:
+            self._send(400, {"error": f"Pedido inválido: {e}"})
+            return
+        self._send(201, job.to_dict())
+
+    def do_PUT(self):
+        if not self._is_bandwidth():
+            self._send(404, {"error": "Ruta inexistente"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("se esperaba un objeto JSON")
+            status = self.jobs.set_bandwidth(payload)
+        except (argparse.ArgumentTypeError, TypeError, ValueError) as e:
+            self._send(400, {"error": f"Pedido inválido: {e}"})
+            return
+        self._send(200, status)
+
+    def do_DELETE(self):
+        job_id = self._job_id()
+        job = self.jobs.cancel(job_id) if job_id is not None else None
+        if job is None:
+            self._send(404, {"error": "Trabajo inexistente"})
+            return
+        self._send(200, job.to_dict())
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main(argv=None):
+    """
+    Contrato:
+        Ejecuta el servidor de trabajos hasta que se interrumpe con Ctrl-C.
+    Precondiciones:
+        `argv` (por defecto `sys.argv[1:]`) debe respetar las opciones declaradas.
+    Postcondiciones:
+        Atiende pedidos HTTP en `--host:--port` o en `--socket`.
+        Al salir cancela los trabajos en curso y cierra el socket.
+    """
+    parser = argparse.ArgumentParser(
+        description="Servidor local que recibe trabajos de descarga y los atiende por prioridad."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Host HTTP (default {DEFAULT_HOST}).")
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help=f"Puerto HTTP (default {DEFAULT_PORT})."
+    )
+    parser.add_argument(
+        "--socket", default=None, help="Escucha en este socket Unix en lugar de HTTP por TCP."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Trabajos simultáneos (default 1)."
+    )
+    parser.add_argument(
+        "-o", "--outdir",
+        default=funcionessp.RAIZ,
+        help=f"Directorio base de salida (por defecto: {funcionessp.RAIZ}).",
+    )
+    parser.add_argument(
+        "--kbps",
+        type=int,
+        default=128,
+        choices=[64, 96, 128, 160, 192, 224, 256, 320],
+        help="Bitrate MP3 en kbps para YouTube (default 128).",
+    )
+    parser.add_argument(
+        "--renditions",
+        type=renditions._parse_renditions,
+        default=None,
+        help="Versiones de YouTube a generar desde una sola descarga (ej.: mp3:320,opus:96).",
+    )
+    parser.add_argument(
+        "--max-filesize",
+        type=funcionesyt._parse_size,
+        default=None,
+        help="Tamaño máximo preferido por tema de YouTube al elegir el formato (ej.: 10M).",
+    )
+    parser.add_argument(
+        "--keep-finished",
+        type=int,
+        default=KEEP_FINISHED,
+        help=f"Trabajos terminados que se conservan para consultar (default {KEEP_FINISHED}).",
+    )
+    parser.add_argument(
+        "--finished-ttl",
+        type=float,
+        default=FINISHED_TTL,
+        help=f"Segundos que se conserva un trabajo terminado (default {FINISHED_TTL:.0f}).",
+    )
+    parser.add_argument("--cookies", default=None, help="Archivo de cookies para YouTube.")
+    parser.add_argument("--proxy", default=None, help="Proxy HTTP/SOCKS para YouTube.")
+    parser.add_argument("--rate-limit", default=None, help="Límite de velocidad (ej.: 2M).")
+    parser.add_argument(
+        "--journal",
+        default=None,
+        help="Archivo del diario de ejecución (por defecto: journal.jsonl en la carpeta de salida).",
+    )
+    parser.add_argument(
+        "--spotdl-engine",
+        choices=funcionessp.SPOTDL_ENGINES,
+        default=funcionessp.SUBPROCESS_ENGINE,
+        help="Cómo ejecutar spotdl: un proceso por comando (default) o como librería "
+        "en este proceso, reutilizando sesión y buscador para toda la ejecución.",
+    )
+    parser.add_argument(
+        "--replaygain",
+        action="store_true",
+        help="Calcula ReplayGain de tema y de disco en paralelo y lo escribe en los MP3.",
+    )
+    parser.add_argument(
+        "--staging-dir",
+        default=None,
+        help="Directorio local (disco rápido o tmpfs) donde se arma cada disco antes "
+        "de publicarlo de una vez en la carpeta de salida.",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=ancho_banda._parse_rate,
+        default=None,
+        metavar="VELOCIDAD",
+        help="Presupuesto total de ancho de banda del proceso, compartido por todas "
+        "las descargas (ej.: 4M; 0 = sin límite).",
+    )
+    parser.add_argument(
+        "--bandwidth-profile",
+        type=ancho_banda._parse_profiles,
+        default=None,
+        metavar="PERFILES",
+        help="Presupuesto por horario local, que tiene prioridad sobre --bandwidth "
+        "(ej.: 08:00-18:00=2M,18:00-08:00=0).",
+    )
+    args = parser.parse_args(argv)
+
+    outdir = Path(args.outdir).resolve()
+    outdir.mkdir(parents=True, exist_ok=True)
+    if args.journal:
+        journal_path = Path(args.journal).resolve()
+    else:
+        journal_path = journal._default_path(outdir)
+    jobs = JobServer(
+        {
+            "outdir": outdir,
+            "kbps": args.kbps,
+            "cookies": args.cookies,
+            "proxy": args.proxy,
+            "rate_limit": args.rate_limit,
+            "journal_path": journal_path,
+            "spotdl_engine": args.spotdl_engine,
+            "replaygain": args.replaygain,
+            "staging_dir": args.staging_dir,
+            "max_filesize": args.max_filesize,
+            "renditions": args.renditions,
+            "bandwidth": ancho_banda._from_args(
+                args.bandwidth, args.bandwidth_profile, always=True
+            ),
+        },
+        workers=max(1, args.workers),
+        keep_finished=max(0, args.keep_finished),
+        finished_ttl=args.finished_ttl,
+    )
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        httpd = _UnixHTTPServer(args.socket, _Handler)
+        where = args.socket
+    else:
+        httpd = ThreadingHTTPServer((args.host, args.port), _Handler)
+        where = f"http://{args.host}:{args.port}"
+    httpd.jobs = jobs
+    jobs.start()
+    logging.info(f"Servidor de trabajos escuchando en {where} con {jobs.workers} worker(s)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Deteniendo el servidor...")
+    finally:
+        httpd.server_close()
+        jobs.stop()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
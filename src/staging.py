@@ -0,0 +1,84 @@
+# Directorio de preparacion local y publicacion atomica de discos en la biblioteca
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+
+def _stage_dir(staging_dir: Path, url: str) -> Path:
+    """
+    Contrato:
+        Calcula el directorio de preparacion de una URL.
+    Precondiciones:
+        `staging_dir` debe ser un directorio en disco local o tmpfs.
+    Postcondiciones:
+        Devuelve una ruta estable para la misma URL, de modo que al reanudar
+        se reutilizan los `.part` ya descargados, y distinta entre URLs para
+        que descargas simultaneas no se pisen.
+    """
+    return Path(staging_dir) / hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+
+def _move_file(source: Path, target: Path):
+    """
+    Contrato:
+        Mueve un archivo reemplazando el destino de forma atomica.
+    Precondiciones:
+        El directorio de `target` debe existir.
+    Postcondiciones:
+        En el mismo sistema de archivos usa un solo `rename`. Entre sistemas
+        distintos copia a un temporal oculto junto al destino y lo renombra,
+        asi nunca queda un archivo a medio escribir con el nombre final.
+    """
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copy2(source, tmp)
+        os.replace(tmp, target)
+        os.remove(source)
+
+
+def _publish_album(staged: Path, final: Path) -> Path:
+    """
+    Contrato:
+        Publica en la biblioteca un disco terminado en el directorio de preparacion.
+    Precondiciones:
+        `staged` debe ser el directorio del disco ya post-procesado.
+        `final` es la ruta del disco dentro de la biblioteca.
+    Postcondiciones:
+        Si el disco no existia, aparece completo de una vez: con un `rename`
+        en el mismo sistema de archivos, o con una copia a un directorio oculto
+        y un `rename` final si la biblioteca esta en otro (por ejemplo NFS).
+        Si el disco ya existia, mueve cada archivo con `_move_file`.
+        Devuelve `final`; `staged` deja de existir.
+    """
+    final.parent.mkdir(parents=True, exist_ok=True)
+    if not final.exists():
+        try:
+            os.rename(staged, final)
+            return final
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        tmp = final.with_name(f".{final.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copytree(staged, tmp)
+        os.rename(tmp, final)
+        shutil.rmtree(staged)
+        logging.info(f"Disco publicado en {final}")
+        return final
+    for item in sorted(staged.rglob("*")):
+        target = final / item.relative_to(staged)
+        if item.is_dir():
+            target.mkdir(exist_ok=True)
+        else:
+            _move_file(item, target)
+    shutil.rmtree(staged)
+    logging.info(f"Disco publicado en {final} (combinado con el existente)")
+    return final
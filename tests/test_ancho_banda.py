@@ -0,0 +1,244 @@
+# Pruebas del presupuesto de ancho de banda compartido
+
+import argparse
+import threading
+import time
+
+import pytest
+
+from src import ancho_banda
+from src.ancho_banda import BandwidthScheduler
+
+MIB = 1024**2
+
+
+class _FakeClock:
+    """
+    Reloj manual para `time.monotonic` y `time.sleep`: dormir adelanta el reloj.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _FakeClock()
+    monkeypatch.setattr(ancho_banda.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(ancho_banda.time, "sleep", fake.sleep)
+    return fake
+
+
+def _at(monkeypatch, hour, minute=0):
+    monkeypatch.setattr(
+        ancho_banda.time, "localtime", lambda: time.struct_time((2026, 1, 1, hour, minute, 0, 3, 1, -1))
+    )
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("2M", 2 * MIB), ("512K", 512 * 1024), ("1.5MiB/s", int(1.5 * MIB)), ("100", 100), ("1g", 1024**3)],
+)
+def test_parse_rate(value, expected):
+    assert ancho_banda._parse_rate(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0", "max", "ilimitado", "sin-limite"])
+def test_parse_rate_unlimited(value):
+    assert ancho_banda._parse_rate(value) is None
+
+
+@pytest.mark.parametrize("value", ["", "rapido", "2T", "-1M"])
+def test_parse_rate_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        ancho_banda._parse_rate(value)
+
+
+def test_parse_profiles():
+    assert ancho_banda._parse_profiles("08:00-18:00=2M, 18:00-24:00=0") == [
+        (480, 1080, 2 * MIB),
+        (1080, 1440, None),
+    ]
+    assert ancho_banda._parse_profiles("") == []
+
+
+@pytest.mark.parametrize("value", ["08:00=2M", "08:00-18:00", "25:00-26:00=1M", "08:60-09:00=1M"])
+def test_parse_profiles_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        ancho_banda._parse_profiles(value)
+
+
+def test_profiles_select_rate_by_local_time(monkeypatch):
+    scheduler = BandwidthScheduler(4 * MIB, ancho_banda._parse_profiles("08:00-18:00=1M,22:00-06:00=0"))
+    _at(monkeypatch, 12)
+    assert scheduler._status()["budget"] == MIB
+    _at(monkeypatch, 23, 30)
+    assert scheduler._status()["budget"] is None
+    _at(monkeypatch, 5, 59)
+    assert scheduler._status()["budget"] is None
+    _at(monkeypatch, 19)
+    assert scheduler._status()["budget"] == 4 * MIB
+
+
+def test_lease_alone_keeps_reserve_for_inprocess_downloads():
+    scheduler = BandwidthScheduler(2_000_000)
+    with scheduler._lease() as share:
+        assert share == 1_500_000
+        assert scheduler._inprocess_rate() == 500_000
+
+
+def test_lease_without_reserve_takes_whole_budget():
+    scheduler = BandwidthScheduler(2_000_000, reserve=0.0)
+    with scheduler._lease() as share:
+        assert share == 2_000_000
+        assert scheduler._inprocess_rate() == 0
+
+
+def test_lease_plus_session_stays_within_budget():
+    scheduler = BandwidthScheduler(2_000_000)
+    with scheduler._session():
+        with scheduler._lease() as share:
+            assert share == 750_000
+            assert share + scheduler._inprocess_rate() == 2_000_000
+
+
+def test_session_started_after_lease_gets_only_the_remainder():
+    scheduler = BandwidthScheduler(2_000_000, reserve=0.0)
+    with scheduler._session(), scheduler._session():
+        with scheduler._lease() as share:
+            assert share == 2_000_000 // 3
+            with scheduler._session():
+                assert share + scheduler._inprocess_rate() == 2_000_000
+
+
+def test_session_started_after_lease_is_not_starved(clock):
+    scheduler = BandwidthScheduler(2 * MIB)
+    with scheduler._lease() as share:
+        with scheduler._session():
+            assert share + scheduler._inprocess_rate() == 2 * MIB
+            for _ in range(4):
+                scheduler._consume(128 * 1024)
+    # La reserva del 25 % (0.5 MiB/s) sigue libre para yt-dlp en proceso
+    assert clock.slept == pytest.approx(1.0, rel=0.01)
+
+
+def test_second_lease_shrinks_to_unreserved_budget():
+    scheduler = BandwidthScheduler(2_000_000, reserve=0.0)
+    with scheduler._session():
+        with scheduler._lease() as first, scheduler._lease() as second:
+            assert first == 1_000_000
+            assert second == 500_000
+            assert first + second + scheduler._inprocess_rate() == 2_000_000
+
+
+def test_lease_waits_until_budget_is_released(monkeypatch):
+    monkeypatch.setattr(BandwidthScheduler, "RECHECK", 0.01)
+    scheduler = BandwidthScheduler(2_000_000, reserve=0.0)
+    shares = []
+
+    def _second():
+        with scheduler._lease() as share:
+            shares.append(share)
+
+    with scheduler._lease():
+        thread = threading.Thread(target=_second)
+        thread.start()
+        thread.join(0.1)
+        # Todo el presupuesto esta reservado: la segunda reserva espera
+        assert thread.is_alive() and shares == []
+    thread.join(1)
+    assert shares == [2_000_000]
+
+
+def test_lease_wait_stops_on_cancel(monkeypatch):
+    monkeypatch.setattr(BandwidthScheduler, "RECHECK", 0.01)
+    scheduler = BandwidthScheduler(2_000_000, reserve=0.0)
+    cancel = threading.Event()
+    cancel.set()
+    with scheduler._lease(), scheduler._lease(cancel) as share:
+        assert share == 1
+
+
+def test_unlimited_lease_and_consume(clock):
+    scheduler = BandwidthScheduler(None)
+    with scheduler._lease() as share:
+        assert share is None
+    scheduler._consume(50 * MIB)
+    assert clock.slept == 0
+
+
+def test_consume_throttles_to_budget(clock):
+    scheduler = BandwidthScheduler(MIB)
+    with scheduler._session():
+        for _ in range(40):
+            scheduler._consume(128 * 1024)
+    # 5 MiB a 1 MiB/s, sin saldo inicial
+    assert clock.slept == pytest.approx(5.0, rel=0.01)
+
+
+def test_consume_shares_budget_with_leases(clock):
+    scheduler = BandwidthScheduler(2 * MIB, reserve=0.0)
+    with scheduler._session(), scheduler._lease() as share:
+        assert share == MIB
+        for _ in range(8):
+            scheduler._consume(128 * 1024)
+    # Solo queda 1 MiB/s para las descargas en proceso
+    assert clock.slept == pytest.approx(1.0, rel=0.01)
+
+
+def test_consume_waits_while_everything_is_leased(monkeypatch):
+    monkeypatch.setattr(BandwidthScheduler, "RECHECK", 0.01)
+    scheduler = BandwidthScheduler(2_000_000, reserve=0.0)
+    cancel = threading.Event()
+    done = threading.Event()
+
+    def _download():
+        scheduler._consume(1024, cancel)
+        done.set()
+
+    with scheduler._lease():
+        thread = threading.Thread(target=_download)
+        thread.start()
+        assert not done.wait(0.1)
+        cancel.set()
+        assert done.wait(1)
+    thread.join()
+
+
+def test_set_rate_applies_live():
+    scheduler = BandwidthScheduler(MIB)
+    scheduler.set_rate(4 * MIB)
+    assert scheduler._status()["budget"] == 4 * MIB
+    scheduler.set_profiles(ancho_banda._parse_profiles("00:00-24:00=0"))
+    assert scheduler._status()["budget"] is None
+    assert scheduler._settings() == {"rate": 4 * MIB, "profiles": [[0, 1440, None]]}
+
+
+def test_status_counts_leased_bandwidth_as_used(clock):
+    scheduler = BandwidthScheduler(2 * MIB)
+    with scheduler._session(), scheduler._lease() as share:
+        started = clock.now
+        scheduler._consume(MIB // 2)
+        clock.now += 1
+        status = scheduler._status()
+        assert status["inprocess_speed"] == pytest.approx((MIB // 2) / (clock.now - started))
+        assert status["leased"] == share
+        assert status["aggregate_speed"] == status["inprocess_speed"] + share
+        assert (status["sessions"], status["leases"]) == (1, 1)
+    assert scheduler._status()["leased"] == 0
+
+
+def test_from_args():
+    assert ancho_banda._from_args(None, None) is None
+    assert ancho_banda._from_args(None, [], always=True) is not None
+    assert ancho_banda._from_args(MIB, None)._status()["budget"] == MIB
+    with ancho_banda._from_args(MIB, None, reserve=0.0)._lease() as share:
+        assert share == MIB
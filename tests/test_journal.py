@@ -0,0 +1,33 @@
+# Pruebas del diario de ejecucion
+
+from src import journal
+
+
+def test_append_and_load_last_state(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal._append(path, "u1", "youtube", journal.QUEUED)
+    journal._append(path, "u1", "youtube", journal.DONE, folder="x")
+    journal._append(path, "u2", "spotify", journal.FAILED, error="e")
+    states = journal._load_states(path, "youtube")
+    assert list(states) == ["u1"]
+    assert states["u1"]["state"] == journal.DONE
+    assert states["u1"]["folder"] == "x"
+
+
+def test_append_after_torn_tail_keeps_new_record(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal._append(path, "u1", "youtube", journal.DONE)
+    # Corte del proceso a mitad de una linea
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"ts": 1, "url": "u2", "source": "youtube", "sta')
+    journal._append(path, "u3", "youtube", journal.DONE)
+    states = journal._load_states(path, "youtube")
+    assert {url: record["state"] for url, record in states.items()} == {
+        "u1": journal.DONE,
+        "u3": journal.DONE,
+    }
+
+
+def test_missing_journal_is_empty(tmp_path):
+    assert journal._load_states(tmp_path / "no-existe.jsonl", "youtube") == {}
+    journal._append(None, "u1", "youtube", journal.DONE)